@@ -46,7 +46,8 @@ ANALYSIS:
 3. If their answer is wrong, identify the EXACT step where the error occurred
 4. Note what steps they completed correctly"""
 
-        analysis = self.vision.analyze_image(state.canvas_path, prompt)
+        #awaited so the multi-second upload + model call doesn't block other requests on the worker
+        analysis = await self.vision.analyze_image_async(state.canvas_path, prompt)
         logger.info(f"Vision analysis complete - success={analysis.get('success', False)}")
         state.analysis = analysis
         return state
\ No newline at end of file
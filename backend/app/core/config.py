@@ -9,6 +9,7 @@ Configuration file for the backend server.
 """
 
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -31,3 +32,7 @@ class Settings(BaseSettings):
 
     
 settings = Settings()
+
+#where uploaded files and canvas images are saved, created once at startup (app/main.py)
+UPLOAD_DIR = Path("uploads")
+CANVAS_DIR = Path("canvas_uploads")
@@ -1,3 +1,4 @@
+import json
 import logging
 import sys
 
@@ -5,6 +6,22 @@ LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
 LOG_FORMAT_NO_TIME = "%(levelname)s [%(name)s] %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+class StructuredFormatter(logging.Formatter):
+    """
+    Formatter that appends a record's `payload` extra as compact JSON, so
+    callers can log one structured record instead of several formatted ones:
+
+        logger.info("canvas.analyze", extra={"payload": {...}})
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        payload = getattr(record, "payload", None)
+        if payload is not None:
+            message = f"{message} {json.dumps(payload, default=str, ensure_ascii=False)}"
+        return message
+
+
 def setup_logging(
     level: str = "INFO",
     include_time: bool = True,
@@ -18,7 +35,7 @@ def setup_logging(
     fmt = LOG_FORMAT if include_time else LOG_FORMAT_NO_TIME
     if leading_newline:
         fmt = "\n" + fmt
-    handler.setFormatter(logging.Formatter(fmt, DATE_FORMAT))
+    handler.setFormatter(StructuredFormatter(fmt, DATE_FORMAT))
     root.setLevel(level)
     root.addHandler(handler)
     
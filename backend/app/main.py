@@ -13,16 +13,16 @@ Entry point for the FastAPI application.
 
 from fastapi import FastAPI, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from app.services.ai_service import chat_with_ai
 import uuid
-from pathlib import Path
 from fastapi import Request
 from app.core.logging_context import request_id_ctx
 from app.core.logging_config import setup_logging
 from app.core.logger import get_logger
-from app.core.config import settings
+from app.core.config import settings, UPLOAD_DIR, CANVAS_DIR
 
 from .routers import canvas, upload, chat, get_documents, regions, steps
 
@@ -46,7 +46,9 @@ class ChatResponse(BaseModel):
 app = FastAPI(
     title = "Interactive AI Tutor",
     description = "An AI-powered tutoring system that helps students learn from their textbooks and study materials through interactive conversations.",
-    version = "0.0.1"
+    version = "0.0.1",
+    #orjson serializes the larger payloads (documents/collections, search results) several times faster
+    default_response_class = ORJSONResponse
 )
 
 #app.include_router(canvas.router)
@@ -56,10 +58,12 @@ app.include_router(get_documents.router)
 #app.include_router(regions.router)
 app.include_router(steps.router)
 
+# Upload directories are created once here, request handlers assume they exist
+UPLOAD_DIR.mkdir(exist_ok=True)
+CANVAS_DIR.mkdir(exist_ok=True)
+
 # Serve canvas images as static files
-canvas_dir = Path("canvas_uploads")
-canvas_dir.mkdir(exist_ok=True)
-app.mount("/canvas_uploads", StaticFiles(directory="canvas_uploads"), name="canvas_uploads")
+app.mount("/canvas_uploads", StaticFiles(directory=CANVAS_DIR), name="canvas_uploads")
 
 
 @app.middleware("http")
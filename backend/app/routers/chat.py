@@ -1,9 +1,11 @@
+import asyncio
 import json
 import uuid
 from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from app.services.conversation_manager import conversation_manager
+from app.agents.chat.workflow import run_chat_workflow, run_chat_workflow_stream
 from typing import Optional
 
 router = APIRouter()
@@ -26,7 +28,10 @@ class ChatResponse(BaseModel):
     status: str = "success"
 
 
-@router.post("/chat", response_model=ChatResponse)
+#response_model=None: fastapi would otherwise validate and dump the return value
+#again. the fields come from our own workflow, so the response is built as is and
+#ChatResponse only documents the schema
+@router.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
 async def chat(request: ChatRequest):
     """Simplified chat endpoint using chat workflow"""
     logger.info(f"Chat request - student={request.student_id}, msg='{request.message[:50]}', conv={request.conversation_id}")
@@ -35,10 +40,12 @@ async def chat(request: ChatRequest):
         conversation_id = request.conversation_id or str(uuid.uuid4())
 
         # Get conversation history
-        history = conversation_manager.get_conversation_history(conversation_id, limit=10)
+        # (conversation_manager makes blocking azure search calls, keep them off the event loop)
+        history = await asyncio.to_thread(conversation_manager.get_conversation_history, conversation_id, limit=10)
         
         # Store user message
-        conversation_manager.store_message(
+        await asyncio.to_thread(
+            conversation_manager.store_message,
             conversation_id=conversation_id,
             student_id=request.student_id,
             role="user",
@@ -48,8 +55,6 @@ async def chat(request: ChatRequest):
         )
         
         # Run chat workflow (handles canvas analysis on-demand internally)
-        from app.agents.chat.workflow import run_chat_workflow
-        
         result = await run_chat_workflow(
             student_id=request.student_id,
             message=request.message,
@@ -57,7 +62,8 @@ async def chat(request: ChatRequest):
         )
         
         # Store assistant response
-        conversation_manager.store_message(
+        await asyncio.to_thread(
+            conversation_manager.store_message,
             conversation_id=conversation_id,
             student_id=request.student_id,
             role="assistant",
@@ -68,23 +74,23 @@ async def chat(request: ChatRequest):
         
         logger.info(f"Chat complete - intent={result['intent']}, action={result['action']}, conv={conversation_id}")
         
-        return ChatResponse(
+        return ORJSONResponse(dict(
             response=result["response"],
             action=result["action"],
             intent=result["intent"],
             conversation_id=conversation_id,
             status="success"
-        )
+        ))
         
     except Exception as e:
         logger.error(f"Chat error: {e}")
-        return ChatResponse(
+        return ORJSONResponse(dict(
             response="I apologize, but I encountered an error. Please try again.",
             intent="error",
             action=None,
             conversation_id=request.conversation_id or "error",
             status="error"
-        )
+        ))
 
 
 
@@ -96,9 +102,10 @@ async def chat_stream(request: ChatRequest):
     
     conversation_id = request.conversation_id or str(uuid.uuid4())
     
-    history = conversation_manager.get_conversation_history(conversation_id, limit=10)
+    history = await asyncio.to_thread(conversation_manager.get_conversation_history, conversation_id, limit=10)
     
-    conversation_manager.store_message(
+    await asyncio.to_thread(
+        conversation_manager.store_message,
         conversation_id=conversation_id,
         student_id=request.student_id,
         role="user",
@@ -107,8 +114,6 @@ async def chat_stream(request: ChatRequest):
         metadata={}
     )
     
-    from app.agents.chat.workflow import run_chat_workflow_stream
-    
     async def event_generator():
         # Send conversation_id first so frontend has it immediately
         yield f"data: {json.dumps({'type': 'meta', 'conversation_id': conversation_id})}\n\n"
@@ -136,7 +141,8 @@ async def chat_stream(request: ChatRequest):
         
         # Store assistant response after streaming completes
         if full_response:
-            conversation_manager.store_message(
+            await asyncio.to_thread(
+                conversation_manager.store_message,
                 conversation_id=conversation_id,
                 student_id=request.student_id,
                 role="assistant",
@@ -160,19 +166,19 @@ async def chat_stream(request: ChatRequest):
 @router.get("/conversations/{student_id}")
 async def get_conversations(student_id: str):
     """Get list of conversations for a student"""
-    conversations = conversation_manager.get_student_conversations(student_id)
+    conversations = await asyncio.to_thread(conversation_manager.get_student_conversations, student_id)
     return {"conversations": conversations, "status": "success"}
 
 @router.get("/conversation/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Get full conversation history"""
-    messages = conversation_manager.get_conversation_history(conversation_id)
+    messages = await asyncio.to_thread(conversation_manager.get_conversation_history, conversation_id)
     return {"messages": messages, "status": "success"}
 
 @router.delete("/conversation/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
-    success = conversation_manager.delete_conversation(conversation_id)
+    success = await asyncio.to_thread(conversation_manager.delete_conversation, conversation_id)
     return {"success": success, "status": "success" if success else "error"}
 
 
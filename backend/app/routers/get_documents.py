@@ -10,29 +10,24 @@ logger = get_logger(__name__)
 router = APIRouter()
 
 
+#plain def: every call below hits chroma synchronously, fastapi runs this in its threadpool
 @router.get("/documents")
-async def get_documents():
+def get_documents():
     #get list of documents from processed directory
     try:
         documents = get_available_documents()
 
         #collection info for debugging purposes
+        #(no per collection count(), that was one extra chroma query per collection)
         collections = chroma_client.list_collections()
-        collection_info = []
-        for collection in collections:
-            info = {
+        collection_info = [
+            {
                 "name":collection.name,
                 "id": collection.id if hasattr(collection, "id") else None,
                 "metadata": collection.metadata if hasattr(collection, "metadata") else {},
             }
-
-            try:
-                count = collection.count()
-                info["document_count"] = count
-            except:
-                info["document_count"] = "Unknown"
-
-            collection_info.append(info)
+            for collection in collections
+        ]
 
         return {
             "documents": documents,
@@ -4,6 +4,7 @@ from the ios canvas app
 
 """
 
+import asyncio
 from fastapi import APIRouter, File, UploadFile, Form
 from app.services.azure_blob_storage import azure_blob_storage
 from fastapi.encoders import jsonable_encoder
@@ -50,20 +51,6 @@ async def regions(
     image_bytes = await image.read()
     logger.info(f"📷 Image received: {len(image_bytes)} bytes")
 
-    canvas_url = azure_blob_storage.upload_canvas_image(
-        image_data=image_bytes,
-        filename=canvas_filename,
-        metadata={
-            "session_id": session_id, 
-            "student_id": student_id, 
-            "timestamp": datetime.now().isoformat()
-        }
-    )
-    logger.info(f"☁️ Canvas uploaded to Azure: {canvas_filename}")
-
-
-
-    
     img = Image.open(io.BytesIO(image_bytes))
     image_width, image_height = img.size
 
@@ -138,24 +125,41 @@ async def regions(
     sprite_buffer = io.BytesIO()
     sprite_sheet.save(sprite_buffer, format="PNG")
     sprite_filename = f"sprite_sheet_{session_id}.png"
-    sprite_url = azure_blob_storage.upload_debug_image(
-        image_data=sprite_buffer.getvalue(),
-        filename=sprite_filename,
-        session_id=session_id
-    )
-
-    logger.info(f"🖼️ Sprite sheet uploaded: {sprite_filename}")
 
     #upload debug to azure
     debug_buffer = io.BytesIO()
     img.save(debug_buffer, format='PNG')
     debug_filename = f"debug_{session_id}.png"
-    
-    debug_url = azure_blob_storage.upload_debug_image(
-        image_data=debug_buffer.getvalue(),
-        filename=debug_filename,
-        session_id=session_id
+
+    #blob uploads are blocking network calls and independent of each other, run them in
+    #worker threads concurrently instead of one round trip after another. they only start
+    #here, so a failure in the clustering / sprite sheet work above uploads nothing
+    canvas_url, sprite_url, debug_url = await asyncio.gather(
+        asyncio.to_thread(
+            azure_blob_storage.upload_canvas_image,
+            image_data=image_bytes,
+            filename=canvas_filename,
+            metadata={
+                "session_id": session_id,
+                "student_id": student_id,
+                "timestamp": datetime.now().isoformat()
+            }
+        ),
+        asyncio.to_thread(
+            azure_blob_storage.upload_debug_image,
+            image_data=sprite_buffer.getvalue(),
+            filename=sprite_filename,
+            session_id=session_id
+        ),
+        asyncio.to_thread(
+            azure_blob_storage.upload_debug_image,
+            image_data=debug_buffer.getvalue(),
+            filename=debug_filename,
+            session_id=session_id
+        ),
     )
+    logger.info(f"☁️ Canvas uploaded to Azure: {canvas_filename}")
+    logger.info(f"🖼️ Sprite sheet uploaded: {sprite_filename}")
     logger.info(f"🐛 Debug image uploaded: {debug_filename}")
     
     try:
@@ -5,8 +5,10 @@ from fastapi import APIRouter, Request, File, UploadFile
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
+from app.core.config import CANVAS_DIR
 from app.core.logger import get_logger
 from app.services.canvas_storage import canvas_storage
+from app.services.uploads import save_upload
 
 logger = get_logger(__name__)
 
@@ -53,12 +55,7 @@ async def analyze_steps(request: Request):
 
 
 
-        canvas_dir = Path("canvas_uploads")
-        canvas_dir.mkdir(exist_ok=True)
-
-        
-
-        steps_dir = canvas_dir / session_id / "steps"
+        steps_dir = CANVAS_DIR / session_id / "steps"
         steps_dir.mkdir(parents=True, exist_ok=True)
 
 
@@ -69,10 +66,8 @@ async def analyze_steps(request: Request):
 
         if full_canvas_file:
             full_canvas_path = steps_dir / "full_canvas.png"
-            content = await full_canvas_file.read()
-            logger.info(f"Canvas image received: {len(content)} bytes")
-            with open(full_canvas_path, "wb") as buffer:
-                buffer.write(content)
+            size = await save_upload(full_canvas_file, full_canvas_path)
+            logger.info(f"Canvas image received: {size} bytes")
         else:
             logger.warning("No 'image' field in form data")
         
@@ -88,9 +83,7 @@ async def analyze_steps(request: Request):
 
             if step_image_file and hasattr(step_image_file, "read"):
                 step_image_path = steps_dir / f"{step_id}.png"
-                with open(step_image_path, "wb") as buffer:
-                    content = await step_image_file.read()
-                    buffer.write(content)
+                await save_upload(step_image_file, step_image_path)
                 
                 logger.debug(f"Saved step {step_id} image to {step_image_path}")
                 step_image_paths[step_id] = step_image_path
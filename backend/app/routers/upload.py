@@ -1,71 +1,137 @@
-
 from fastapi import APIRouter
-from fastapi import File, UploadFile
+from fastapi import BackgroundTasks, File, Response, UploadFile
 from pathlib import Path
+from collections import OrderedDict
+from functools import lru_cache
 import uuid
-from app.core.logger import get_logger 
+from app.core.config import UPLOAD_DIR
+from app.core.logger import get_logger
 from app.services.course_rag_service import CourseRAGService
+from app.services.uploads import save_upload
 from app.services.vision import VisionService
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 
+#file types /upload accepts: pdfs are indexed, images go through vision analysis
+SUPPORTED_EXTENSIONS = frozenset({'.pdf', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'})
 
-@router.post("/upload")
-async def upload_document(file: UploadFile=File(...)):
-    """
-    Upload a document for processing and indexing to Azure Search.
-    Supports PDFs (course materials) and images (vision analysis).
-    """
-    try:
-        file_extension = Path(file.filename).suffix.lower()
-        supported_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+#job_id -> status of a background upload, oldest jobs are dropped past the cap.
+#process local: this assumes a single uvicorn worker (as run in the README),
+#with several workers a status poll can land on a worker that never saw the job
+MAX_TRACKED_JOBS = 1000
+upload_jobs: "OrderedDict[str, dict]" = OrderedDict()
 
-        if file_extension not in supported_extensions:
-            return {
-                "error": "Unsupported file type. Only PDF, JPG, JPEG, PNG, GIF, BMP, and WEBP files are allowed.", 
-                "status": "error"
-            }
-            
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
 
-        file_path = upload_dir / file.filename
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+#services are built once on first use and shared by every upload, built lazily
+#so a missing azure/openai config only fails the upload instead of app startup
+@lru_cache(maxsize=None)
+def get_course_service() -> CourseRAGService:
+    return CourseRAGService()
+
 
-        logger.info(f"Processing {file.filename} ({file_extension})")
+@lru_cache(maxsize=None)
+def get_vision_service() -> VisionService:
+    return VisionService()
 
+
+def _process_upload(job_id: str, file_path: str, filename: str, file_extension: str) -> None:
+    """
+    Runs the slow part of an upload (indexing / vision analysis) after the response is sent.
+    Progress and results are recorded in upload_jobs[job_id].
+    """
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return
+    job["status"] = "processing"
+    logger.info(f"Processing {filename} ({file_extension})")
+
+    try:
         if file_extension == '.pdf':
-            course_service = CourseRAGService()
-            result = course_service.upload_pdf(str(file_path))
-            
-            return {
-                "message": f"PDF {file.filename} uploaded to Azure Search successfully.",
-                "filename": file.filename,
-                "file_path": str(file_path),
+            result = get_course_service().upload_pdf(file_path)
+
+            job.update({
+                "message": f"PDF {filename} uploaded to Azure Search successfully.",
                 "file_type": "document",
                 "chunks_uploaded": result.get("chunks_uploaded", 0),
                 "status": "success"
-            }
+            })
         else:
-            vision_service = VisionService()
-            analysis = vision_service.analyze_image(str(file_path))
-            
-            return {
-                "message": f"Image {file.filename} analyzed successfully.",
-                "filename": file.filename,
-                "file_path": str(file_path),
+            analysis = get_vision_service().analyze_image(file_path)
+
+            job.update({
+                "message": f"Image {filename} analyzed successfully.",
                 "file_type": "image",
                 "analysis": analysis,
                 "status": "success"
+            })
+    except Exception as e:
+        logger.error(f"Upload processing error: {e}")
+        job.update({
+            "error": str(e),
+            "status": "error"
+        })
+
+
+@router.post("/upload")
+async def upload_document(response: Response, background_tasks: BackgroundTasks, file: UploadFile=File(...)):
+    """
+    Upload a document for processing and indexing to Azure Search.
+    Supports PDFs (course materials) and images (vision analysis).
+
+    The file is saved and a job id returned right away (202); processing runs
+    in the background and can be polled at /upload/status/{job_id}.
+    """
+    try:
+        file_extension = Path(file.filename).suffix.lower()
+        if file_extension not in SUPPORTED_EXTENSIONS:
+            return {
+                "error": "Unsupported file type. Only PDF, JPG, JPEG, PNG, GIF, BMP, and WEBP files are allowed.",
+                "status": "error"
             }
-            
+
+        file_path = UPLOAD_DIR / file.filename
+        await save_upload(file, file_path)
+
+        job_id = uuid.uuid4().hex
+        upload_jobs[job_id] = {
+            "job_id": job_id,
+            "filename": file.filename,
+            "file_path": str(file_path),
+            "status": "queued"
+        }
+        while len(upload_jobs) > MAX_TRACKED_JOBS:
+            upload_jobs.popitem(last=False)
+
+        background_tasks.add_task(_process_upload, job_id, str(file_path), file.filename, file_extension)
+
+        response.status_code = 202
+        return {
+            "message": f"{file.filename} uploaded, processing started.",
+            "job_id": job_id,
+            "filename": file.filename,
+            "file_path": str(file_path),
+            "status_url": f"/upload/status/{job_id}",
+            "status": "queued"
+        }
+
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return {
             "error": str(e),
             "status": "error"
-        }
\ No newline at end of file
+        }
+
+
+@router.get("/upload/status/{job_id}")
+async def upload_status(job_id: str):
+    """Get the status (and result once finished) of a background upload"""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return {
+            "error": f"Unknown upload job: {job_id}",
+            "status": "error"
+        }
+    return job
+
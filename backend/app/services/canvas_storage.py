@@ -5,17 +5,31 @@ Analysis is done on-demand when the chat agent needs it.
 
 from typing import Dict, Optional
 from datetime import datetime
+import hashlib
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
+
+def image_digest(image_path: str) -> Optional[str]:
+    """
+    sha256 of the canvas file's bytes. Only a byte-identical re-submit matches,
+    any stroke change (a minus sign, a fixed digit) gives a new digest.
+    """
+    try:
+        with open(image_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError as e:
+        logger.warning(f"Could not hash canvas image {image_path}: {e}")
+        return None
+
 class CanvasStorage:
     """In-memory storage for canvas image paths and cached analyses"""
     
     def __init__(self):
         # {student_id: {image_path, timestamp}}
         self._images: Dict[str, Dict] = {}
-        # {student_id: {analysis, timestamp}} — cached after on-demand vision call
+        # {student_id: {analysis, timestamp, image_digest}} — cached after on-demand vision call
         self._analysis_cache: Dict[str, Dict] = {}
         # {conversation_id: image_path} — last canvas image shown in each conversation
         self._last_shown: Dict[str, str] = {}
@@ -26,8 +40,7 @@ class CanvasStorage:
             "image_path": image_path,
             "timestamp": datetime.now()
         }
-        # Invalidate cached analysis since canvas changed
-        self._analysis_cache.pop(student_id, None)
+        # Cached analysis is dropped in get_analysis unless the new canvas is byte-identical
         logger.info(f"Canvas image updated for student {student_id}: {image_path}")
     
     def get_image_path(self, student_id: str) -> Optional[str]:
@@ -37,9 +50,11 @@ class CanvasStorage:
     
     def store_analysis(self, student_id: str, analysis: str) -> None:
         """Cache analysis result after on-demand vision call"""
+        image_path = self.get_image_path(student_id)
         self._analysis_cache[student_id] = {
             "analysis": analysis,
-            "timestamp": datetime.now()
+            "timestamp": datetime.now(),
+            "image_digest": image_digest(image_path) if image_path else None
         }
         logger.info(f"Analysis cached for student {student_id}")
     
@@ -52,8 +67,14 @@ class CanvasStorage:
         # Check if image was updated after analysis was cached
         image_data = self._images.get(student_id)
         if image_data and image_data["timestamp"] > cache["timestamp"]:
-            # Image is newer than cached analysis — stale
-            return None
+            # Image is newer than cached analysis — still usable only if the iPad
+            # re-sent exactly the canvas that was analyzed, otherwise stale
+            new_digest = image_digest(image_data["image_path"])
+            if new_digest is None or new_digest != cache["image_digest"]:
+                self._analysis_cache.pop(student_id, None)
+                return None
+            cache["timestamp"] = datetime.now()
+            logger.info(f"Canvas for student {student_id} is unchanged, reusing cached analysis")
         
         return cache["analysis"]
     
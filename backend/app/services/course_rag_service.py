@@ -8,6 +8,12 @@ from datetime import datetime
 
 logger = get_logger(__name__)
 
+#compiled once: latex equations ($$...$$ display, $...$ inline), paragraph breaks,
+#and the placeholders equations are swapped out for while splitting
+_LATEX_RE = re.compile(r'\$\$.*?\$\$|\$.*?\$', re.DOTALL)
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_EQ_PLACEHOLDER_RE = re.compile(r'___EQ_(\d+)___')
+
 class CourseRAGService:
     def __init__(self):
         self.azure_search = AzureSearchService()
@@ -192,38 +198,24 @@ class CourseRAGService:
         Focus: Math equations only
         """
     
-    # Step 1: Protect LaTeX equations
+    # Step 1: Protect LaTeX equations (one pass, $$...$$ is tried before $...$ at each position)
         equations = []
-        protected_text = text
-    
-    # Match $...$ and $$...$$
-        latex_patterns = [
-            (r'\$\$.*?\$\$', 'DISPLAY'),  # Display equations
-            (r'\$.*?\$', 'INLINE'),        # Inline equations
-        ]
-    
-        for pattern, eq_type in latex_patterns:
-            matches = list(re.finditer(pattern, protected_text, re.DOTALL))
-            for i, match in enumerate(matches):
-                placeholder = f"___{eq_type}_EQ_{len(equations)}___"
-                equations.append(match.group(0))
-                protected_text = protected_text.replace(match.group(0), placeholder, 1)
+
+        def protect(match):
+            equations.append(match.group(0))
+            return f"___EQ_{len(equations) - 1}___"
+
+        protected_text = _LATEX_RE.sub(protect, text)
     
     # Step 2: Split by double newlines
-        paragraphs = re.split(r'\n\s*\n', protected_text)
+        paragraphs = _PARAGRAPH_RE.split(protected_text)
     
     # Step 3: Restore equations
-        restored = []
-        for para in paragraphs:
-            for i, eq in enumerate(equations):
-                para = para.replace(f"___DISPLAY_EQ_{i}___", eq)
-                para = para.replace(f"___INLINE_EQ_{i}___", eq)
-        
-            para = para.strip()
-            if para:  # Only keep non-empty paragraphs
-                restored.append(para)
-    
-        return restored
+        if equations:
+            restore = lambda match: equations[int(match.group(1))]
+            paragraphs = (_EQ_PLACEHOLDER_RE.sub(restore, para) for para in paragraphs)
+
+        return [para for para in (para.strip() for para in paragraphs) if para]
     
     def _chunk_page(self, page_data: Dict, source_file: str) -> List[Dict]:
         """
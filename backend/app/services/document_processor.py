@@ -1,18 +1,224 @@
-import PyPDF2
+import pypdfium2 as pdfium
 from pathlib import Path
-import json
-from typing import List, Dict
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
 import chromadb
+import numpy as np
+import orjson
 
-import uuid
+from app.core.logger import get_logger
+from app.services.pdf_text import PDF_WORKERS, extract_page_range, extract_page_ranges
+from app.services.vector_index import VectorIndex
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = get_logger(__name__)
 
 chroma_client = chromadb.PersistentClient(path="./vector_db")
 
+#same model as chroma's default embedding function, so vectors stay compatible
+#with collections that were embedded by chroma itself
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+_encoder = None
+_encoder_lock = threading.Lock()
+
+#sqlite file holding the embeddings computed so far, keyed by sha256(model + text),
+#so re-uploaded content and repeat queries skip the encoder across restarts
+EMBEDDING_CACHE_PATH = "./embedding_cache.db"
+#rows kept in the cache, the oldest writes are dropped past this (~1.5KB per 384-dim row)
+EMBEDDING_CACHE_MAX_ROWS = 100_000
+_embedding_db = None
+_embedding_db_lock = threading.Lock()
+#max keys per SELECT ... IN (...), below sqlite's bound variable limit
+EMBEDDING_CACHE_LOOKUP_BATCH = 500
+
+#every stored embedding in one matrix, searched without going through chroma.
+#saved under VECTOR_INDEX_PATH and memory mapped on the next start
+VECTOR_INDEX_PATH = "./vector_index"
+vector_index = VectorIndex(chroma_client, path=VECTOR_INDEX_PATH, model_name=EMBEDDING_MODEL)
+#rows appended since the last save would otherwise be re-read from chroma next start
+atexit.register(vector_index.save)
+
+#max number of chunks sent to chromadb per collection.add call
+BATCH_SIZE = 250
+
+#pdfs with more pages than this get their text extracted across a process pool
+PARALLEL_PAGE_THRESHOLD = 20
+
+#name -> collection handle, so queries don't re-open every collection each time
+_collection_cache = {}
+
+#get_available_documents result, reused for DOCUMENTS_CACHE_TTL seconds
+DOCUMENTS_CACHE_TTL = 5
+_documents_cache = {"t": 0.0, "v": []}
+
+#max threads used to query collections in parallel
+MAX_QUERY_WORKERS = 8
+
+#retrieval cache: (normalized query, top_k) -> (inserted_at, query embedding, chunks)
+RETRIEVAL_CACHE_SIZE = 500
+RETRIEVAL_CACHE_TTL = 300  #seconds
+#cosine similarity above which a cached query counts as the same question
+SEMANTIC_CACHE_THRESHOLD = 0.95
+#number of query strings whose embedding is kept around
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+_retrieval_cache = OrderedDict()
+_retrieval_cache_lock = threading.RLock()
+
+
+def _get_encoder() -> "SentenceTransformer":
+    """
+    Returns the process wide sentence transformer, loading it on first use.
+    sentence_transformers (and torch) are imported here too, so importing this
+    module at app startup doesn't load them.
+
+    Encoding ourselves means one model load per process and one batched
+    forward pass per document, instead of chroma building its default
+    embedding function on every add/query call.
+    """
+    global _encoder
+    if _encoder is None:
+        #first callers can race (query worker threads, background uploads),
+        #only one of them should pay for the model load
+        with _encoder_lock:
+            if _encoder is None:
+                from sentence_transformers import SentenceTransformer
+                #device None picks cuda when it is available
+                _encoder = SentenceTransformer(EMBEDDING_MODEL)
+    return _encoder
+
+
+def _get_embedding_db() -> sqlite3.Connection:
+    """
+    Returns the embedding cache connection, creating the db on first use.
+    Callers must hold _embedding_db_lock.
+    """
+    global _embedding_db
+    if _embedding_db is None:
+        _embedding_db = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+        _embedding_db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        _embedding_db.commit()
+    return _embedding_db
+
+
+def _embedding_key(text: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _load_cached_embeddings(keys: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Fetch the cached embeddings for the given keys (missing keys are left out)
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    found = {}
+    try:
+        with _embedding_db_lock:
+            db = _get_embedding_db()
+            for start in range(0, len(unique_keys), EMBEDDING_CACHE_LOOKUP_BATCH):
+                batch = unique_keys[start:start + EMBEDDING_CACHE_LOOKUP_BATCH]
+                rows = db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32)
+    except sqlite3.Error as e:
+        #the cache is only an optimization, fall back to encoding everything
+        logger.warning(f"Error reading embedding cache: {e}")
+    return found
+
+
+def _store_cached_embeddings(embeddings: Dict[str, np.ndarray]) -> None:
+    try:
+        with _embedding_db_lock:
+            db = _get_embedding_db()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in embeddings.items()],
+            )
+            #INSERT OR REPLACE gives every write a new, larger rowid, so the lowest
+            #rowids are the oldest entries
+            db.execute(
+                "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                (EMBEDDING_CACHE_MAX_ROWS,),
+            )
+            db.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Error writing embedding cache: {e}")
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed a list of texts with the shared encoder.
+
+    Texts embedded before (in this or an earlier run) are read from the
+    on-disk embedding cache, only the rest go through the encoder.
+
+    Args:
+        texts (List[str]): Texts to embed.
+
+    Returns:
+        List[List[float]]: One normalized embedding per text.
+    """
+    keys = [_embedding_key(text) for text in texts]
+    embeddings = _load_cached_embeddings(keys)
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+    if missing:
+        vectors = _get_encoder().encode(
+            list(missing.values()),
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        new_embeddings = dict(zip(missing, vectors))
+        _store_cached_embeddings(new_embeddings)
+        embeddings.update(new_embeddings)
+
+    return [np.asarray(embeddings[key], dtype=np.float32).tolist() for key in keys]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase and collapse whitespace. The encoder's tokenizer is uncased and
+    splits on whitespace, so this never changes the embedding, it only lets
+    "What is X?" and " what is  x?" share one cache entry.
+    """
+    return " ".join(query.lower().split())
+
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _embed_query(query: str) -> Tuple[float, ...]:
+    return tuple(embed_texts([query])[0])
+
+
+def embed_query(query: str) -> List[float]:
+    """
+    Embed a single query, memoized (in memory, and on disk through the
+    embedding cache) so a repeated query only runs the encoder once.
+    """
+    return list(_embed_query(normalize_query(query)))
+
+
 def extract_text_from_pdf(file_path: str) -> str:
     """
     Extract text from a PDF file.
 
+    Small PDFs are extracted serially in this process, larger ones are split
+    into contiguous page ranges that are extracted in parallel on the shared
+    pdf_text worker pool.
+
     Args:
         file_path (str): Path to the PDF file.
 
@@ -21,14 +227,24 @@ def extract_text_from_pdf(file_path: str) -> str:
     """
 
     try:
-        text = ""
-        reader = PyPDF2.PdfReader(file_path)
-        for page in reader.pages:
-            text += page.extract_text()
-            text += "\n"
-        return text.strip()
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            num_pages = len(pdf)
+        finally:
+            pdf.close()
+
+        if num_pages <= PARALLEL_PAGE_THRESHOLD:
+            return extract_page_range((file_path, 0, num_pages)).strip()
+
+        workers = min(PDF_WORKERS, num_pages)
+        step = -(-num_pages // workers)
+        page_ranges = [
+            (file_path, start, min(start + step, num_pages))
+            for start in range(0, num_pages, step)
+        ]
+        return extract_page_ranges(page_ranges).strip()
     except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
+        logger.error(f"Error extracting text from PDF: {e}")
         return ""
     
 
@@ -62,27 +278,23 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[Di
     if not text:
         return []
     
-    chunks = []
-    start_pos = 0
-    chunk_id = 0
-
-
-    while start_pos < len(text):
-        end = start_pos + chunk_size
-        chunk_text = text[start_pos:end]
-        
-        chunks.append({
+    #offsets are computed up front, lengths come from the offsets rather than len(slice)
+    text_length = len(text)
+    ranges = [
+        (start_pos, min(start_pos + chunk_size, text_length))
+        for start_pos in range(0, text_length, chunk_size - overlap)
+    ]
+
+    return [
+        {
             "id": chunk_id,
-            "text": chunk_text,
+            "text": text[start_pos:end_pos],
             "start_pos": start_pos,
-            "end_pos": end,
-            "length": len(chunk_text)
-        })
-
-        start_pos += chunk_size - overlap
-        chunk_id += 1
-    
-    return chunks
+            "end_pos": end_pos,
+            "length": end_pos - start_pos
+        }
+        for chunk_id, (start_pos, end_pos) in enumerate(ranges)
+    ]
 
 
 
@@ -103,13 +315,13 @@ def store_chunks_in_vector_db(chunks: List[Dict], document_name:str) -> str:
     """
 
     try:
-        print(f"Storing {len(chunks)} chunks in chromadb for document: {document_name}")
+        logger.info(f"Storing {len(chunks)} chunks in chromadb for document: {document_name}")
 
 
         #creating collection name
         collection_name = document_name.replace(" ", "_").replace(".", "_").replace("-", "_").lower()
 
-        print(f"Creating collection: {collection_name}")
+        logger.debug(f"Creating collection: {collection_name}")
 
 
         #create or get the collection
@@ -118,54 +330,233 @@ def store_chunks_in_vector_db(chunks: List[Dict], document_name:str) -> str:
             metadata={
                 "document_name": document_name,
                 "total_chunks": len(chunks),
-                "created_at": str(uuid.uuid4())  #using uuid to generate unique collection name
+                "created_at": time.time()
             }
         )
-        print(f"Collection created: {collection_name}")
+        _collection_cache[collection_name] = collection
+        logger.debug(f"Collection created: {collection_name}")
 
 
         #prepare data for storage in chromadb
 
-        documents = [] #text content
-        ids = [] #unique identifier for each chunk
-        metadatas = [] #metadata for each chunk
-
-
-        for chunk in chunks:
-            documents.append(chunk["text"])
-            ids.append(f"{document_name}_chunk_{chunk['id']}")
-            metadatas.append({
+        documents = [chunk["text"] for chunk in chunks] #text content
+        ids = [f"{document_name}_chunk_{chunk['id']}" for chunk in chunks] #unique identifier for each chunk
+        metadatas = [
+            {
                 "chunk_id": chunk["id"],
                 "start_pos": chunk["start_pos"],
                 "end_pos": chunk["end_pos"],
                 "length": chunk["length"],
                 "document_name": document_name
-            })
-
-        print(f"prepared {len(documents)} documents for storage in chromadb")
+            }
+            for chunk in chunks
+        ] #metadata for each chunk
+
+        logger.debug(f"prepared {len(documents)} documents for storage in chromadb")
+
+        #embed everything in one batched pass, then store in chromadb in batches
+        #to keep each insert transaction small
+        embeddings = embed_texts(documents)
+        for start in range(0, len(documents), BATCH_SIZE):
+            end = start + BATCH_SIZE
+            collection.add(
+                documents=documents[start:end],
+                ids=ids[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end]
+            )
+        logger.info(f"stored {len(documents)} documents in chromadb")
 
-        #store in chromadb
-        collection.add(
-            documents=documents,
-            ids=ids,
-            metadatas=metadatas
-        )
-        print(f"stored {len(documents)} documents in chromadb")
 
+        #verify storage in chromadb, count() is a round trip so only when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Collection now contains {collection.count()} chunks")
 
-        #verify storage in chromadb
-        count = collection.count()
-        print(f"Collection now contains {count} chunks")
+        #new chunks can change the answer to any cached query
+        clear_retrieval_cache()
+        clear_documents_cache()
+        vector_index.add(collection, ids, embeddings, documents, metadatas)
 
         return collection_name
     except Exception as e:
-        print(f"Error storing chunks in chromadb: {e}")
+        logger.error(f"Error storing chunks in chromadb: {e}")
+        #some batches may have been stored before the failure
+        vector_index.invalidate()
         return None
 
         
+def _get_collection(name: str):
+    """
+    Returns a cached chroma collection handle, opening it on first use
+    """
+    collection = _collection_cache.get(name)
+    if collection is None:
+        collection = chroma_client.get_collection(name=name)
+        _collection_cache[name] = collection
+    return collection
+
+
+def get_or_create_collection(name: str, metadata: Dict):
+    """
+    Returns a cached chroma collection handle, creating the collection (with
+    metadata) the first time it is seen. Later calls skip the chroma round trip.
+    """
+    collection = _collection_cache.get(name)
+    if collection is None:
+        collection = chroma_client.get_or_create_collection(
+            name=name,
+            metadata=metadata
+        )
+        _collection_cache[name] = collection
+    return collection
+
+
+def delete_collection(name: str) -> None:
+    """
+    Delete a chroma collection and drop everything cached for it
+    """
+    _collection_cache.pop(name, None)
+    chroma_client.delete_collection(name=name)
+    clear_retrieval_cache()
+    clear_documents_cache()
+    vector_index.invalidate()
+
+
+def delete_documents(collection_name: str, ids: List[str]) -> None:
+    """
+    Delete specific documents from a collection by id, keeping the collection
+    (and its index) around. Much cheaper than delete_collection when only a
+    few entries need to go.
+    """
+    _get_collection(collection_name).delete(ids=ids)
+    clear_retrieval_cache()
+    clear_documents_cache()
+    vector_index.invalidate()
+
+
+def clear_documents_cache() -> None:
+    """
+    Force the next get_available_documents call to re-read the collections
+    """
+    _documents_cache["t"] = 0.0
+
+
+def clear_retrieval_cache() -> None:
+    """
+    Drop every cached retrieval result. Called whenever new content is stored.
+    """
+    with _retrieval_cache_lock:
+        _retrieval_cache.clear()
+
+
+def get_cached_chunks(key: Tuple, query_embedding: Optional[List[float]] = None) -> Optional[List[Dict]]:
+    """
+    Look up cached retrieval results, see get_cached_results
+    """
+    cached = get_cached_results(key, query_embedding)
+    return None if cached is None else cached[0]
+
+
+def get_cached_results(key: Tuple, query_embedding: Optional[List[float]] = None) -> Optional[Tuple[List[Dict], Dict]]:
+    """
+    Look up cached retrieval results along with the stats they were cached with.
+
+    Keys are (normalized query, top_k, ...). Without an embedding only the
+    exact key is checked. With one, the most similar cached query whose key
+    matches everywhere but the query text is used if its cosine similarity
+    is above SEMANTIC_CACHE_THRESHOLD.
+    """
+    now = time.monotonic()
+    with _retrieval_cache_lock:
+        if query_embedding is None:
+            #exact lookups stay O(1), only this entry's age is checked
+            entry = _retrieval_cache.get(key)
+            if entry is None:
+                return None
+            if now - entry[0] >= RETRIEVAL_CACHE_TTL:
+                del _retrieval_cache[key]
+                return None
+            hit_key = key
+        else:
+            #the similarity scan touches every entry anyway, drop the expired ones first
+            expired = [k for k, (inserted_at, _, _, _) in _retrieval_cache.items() if now - inserted_at >= RETRIEVAL_CACHE_TTL]
+            for k in expired:
+                del _retrieval_cache[k]
+
+            candidates = [k for k in _retrieval_cache if k[1:] == key[1:]]
+            if not candidates:
+                return None
+            #embeddings are normalized, so the dot product is the cosine similarity
+            cached_embeddings = np.array([_retrieval_cache[k][1] for k in candidates])
+            similarities = cached_embeddings @ np.asarray(query_embedding)
+            best = int(similarities.argmax())
+            if similarities[best] < SEMANTIC_CACHE_THRESHOLD:
+                return None
+            hit_key = candidates[best]
+
+        _retrieval_cache.move_to_end(hit_key)
+        _, _, chunks, stats = _retrieval_cache[hit_key]
+        return [dict(chunk) for chunk in chunks], dict(stats)
+
+
+def cache_chunks(key: Tuple, query_embedding: List[float], chunks: List[Dict], stats: Optional[Dict] = None) -> None:
+    """
+    Store retrieval results under key for get_cached_chunks, evicting the
+    least recently used entry past RETRIEVAL_CACHE_SIZE. stats (e.g. how many
+    collections were searched) come back from get_cached_results with them.
+    """
+    with _retrieval_cache_lock:
+        _retrieval_cache.pop(key, None)
+        _retrieval_cache[key] = (time.monotonic(), query_embedding, [dict(chunk) for chunk in chunks], dict(stats or {}))
+        while len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+            _retrieval_cache.popitem(last=False)
+
+
+def _query_collection(collection_info, query_embedding: List[float], top_k: int) -> List[Dict]:
+    """
+    Query a single collection, returning its chunks (or [] if the query fails)
+    """
+    try:    
+        collection = _get_collection(collection_info.name)
+
+
+        results = collection.query(
+            query_embeddings = [query_embedding],
+            #top_k per collection is exactly enough for the global top_k
+            n_results = top_k
+        )
+
+        documents = results["documents"][0]
+        metadatas = results["metadatas"][0]
+        distances = results.get('distances', [None])[0]
+
+        chunks = []
+        for i in range(len(documents)):
+            chunk_data = {
+                "text": documents[i],
+                "metadata": metadatas[i],
+                "similarity_score": 1- distances[i] if distances and distances[i] is not None else None,
+                "collection_name": collection_info.name,
+                "document_name": metadatas[i].get("document_name", collection_info.name),
+                "content_type": metadatas[i].get("content_type", "text")
+            }
+            chunks.append(chunk_data)
+        return chunks
+    except Exception as e:
+        #the handle may be stale (e.g. collection deleted elsewhere), reopen next time
+        _collection_cache.pop(collection_info.name, None)
+        logger.error(f"Error retrieving chunks from collection {collection_info.name}: {e}")
+        return []
+
+
 def retrieve_relevant_chunks(query: str, top_k: int = 3) -> List[Dict]:
     try:
 
+        cache_key = (normalize_query(query), top_k)
+        cached = get_cached_chunks(cache_key)
+        if cached is not None:
+            return cached
+
         #get all collections from chroma
         all_collections = chroma_client.list_collections()
 
@@ -173,51 +564,39 @@ def retrieve_relevant_chunks(query: str, top_k: int = 3) -> List[Dict]:
             return[]
         
 
-        all_chunks = []
-        for collection_info in all_collections:
-            try:    
-                collection = chroma_client.get_collection(name=collection_info.name)
+        #embed the query once and reuse it for every collection
+        query_embedding = embed_query(query)
 
+        #a near identical question may already be cached
+        cached = get_cached_chunks(cache_key, query_embedding)
+        if cached is not None:
+            return cached
 
-                results = collection.query(
-                    query_texts = [query],
-                    n_results = min(top_k, 10)
-                )
-
-                documents = results["documents"][0]
-                metadatas = results["metadatas"][0]
-                distances = results.get('distances', [None])[0]
-
-                for i in range(len(documents)):
-                    chunk_data = {
-                        "text": documents[i],
-                        "metadata": metadatas[i],
-                        "similarity_score": 1- distances[i] if distances and distances[i] is not None else None,
-                        "collection_name": collection_info.name,
-                        "document_name": metadatas[i].get("document_name", collection_info.name),
-                        "content_type": metadatas[i].get("content_type", "text")
-                    }
-                    all_chunks.append(chunk_data)
-            except Exception as e:
-                print(f"Error retrieving chunks from collection {collection_info.name}: {e}")
-                continue
+        #query every collection concurrently, chroma queries are read only
+        with ThreadPoolExecutor(max_workers=min(MAX_QUERY_WORKERS, len(all_collections))) as executor:
+            per_collection = executor.map(
+                lambda collection_info: _query_collection(collection_info, query_embedding, top_k),
+                all_collections,
+            )
+            all_chunks = [chunk for chunks in per_collection for chunk in chunks]
     
-        all_chunks.sort(key=lambda x: x['similarity_score'] or 0, reverse=True)
-
         # Take top_k results and add rank
-        final_chunks = all_chunks[:top_k]
+        final_chunks = heapq.nlargest(top_k, all_chunks, key=lambda x: x['similarity_score'] or 0)
         for i, chunk in enumerate(final_chunks):
             chunk["rank"] = i + 1
         
-        print(f"✅ Found {len(final_chunks)} relevant chunks from {len(all_collections)} collections")
+        logger.info(f"Found {len(final_chunks)} relevant chunks from {len(all_collections)} collections")
+        cache_chunks(cache_key, query_embedding, final_chunks)
         return final_chunks
     except Exception as e:
-        print(f"Error retrieving relevant chunks: {e}")
+        logger.error(f"Error retrieving relevant chunks: {e}")
         return []
     
 
 
 def get_available_documents() -> List[str]:
+    if time.monotonic() - _documents_cache["t"] < DOCUMENTS_CACHE_TTL:
+        return list(_documents_cache["v"])
     try:
         collections = chroma_client.list_collections()
         documents = []
@@ -227,9 +606,11 @@ def get_available_documents() -> List[str]:
                 documents.append(doc_name)
             else:
                 documents.append(collection.name)
-        return documents
+        _documents_cache["v"] = documents
+        _documents_cache["t"] = time.monotonic()
+        return list(documents)
     except Exception as e:
-        print(f"Error getting available documents: {e}")
+        logger.error(f"Error getting available documents: {e}")
         return []
     
 
@@ -251,7 +632,7 @@ def process_document(file_path: str) -> Dict:
     try:
         #extract text from pdf
 
-        print(f"starting RAG pipeline for {file_path}")
+        logger.info(f"starting RAG pipeline for {file_path}")
 
         text = extract_text_from_pdf(file_path)
 
@@ -303,10 +684,8 @@ def process_document(file_path: str) -> Dict:
             "processed_at": str(Path(file_path).stat().st_mtime)
         }
 
-        #save to json file
-
-        with open(processed_file, "w", encoding="utf-8") as f:
-            json.dump(processed_data, f, indent=2)
+        #save to json file, compact orjson output since this can hold every chunk's text
+        processed_file.write_bytes(orjson.dumps(processed_data))
 
         return {
             "status": "success",
@@ -375,7 +754,7 @@ def test_retrieval_system():
                     print("❌ No results found")
             
             # Cleanup
-            chroma_client.delete_collection(name=collection_name)
+            delete_collection(collection_name)
             print("\n🧹 Test cleanup completed")
             return True
         
@@ -412,14 +791,14 @@ def test_vector_storage():
             #test retrieving chunks
             collection = chroma_client.get_or_create_collection(name=collection_name)
             results = collection.query(
-                query_texts=["what is photosynthesis"],
+                query_embeddings=[embed_query("what is photosynthesis")],
                 n_results=2
             )
             print("test query results:")
             for i, doc in enumerate(results["documents"][0]):
                 print(f"{i+1}. {doc[:50]}...")
             #clean up
-            chroma_client.delete_collection(name=collection_name)
+            delete_collection(collection_name)
             print("✅ Collection deleted successfully!")
 
             return True
@@ -441,20 +820,21 @@ def test_chromadb_connection():
         # Test adding a simple document
         test_collection.add(
             documents=["This is a test document"],
+            embeddings=embed_texts(["This is a test document"]),
             ids=["test_1"]
         )
         print("✅ Document storage successful!")
         
         # Test querying
         results = test_collection.query(
-            query_texts=["test document"],
+            query_embeddings=[embed_query("test document")],
             n_results=1
         )
         print("✅ Query successful!")
         print(f"Retrieved: {results['documents'][0][0]}")
         
         # Clean up
-        chroma_client.delete_collection(name="test_collection")
+        delete_collection("test_collection")
         print("✅ Cleanup successful!")
         
         return True
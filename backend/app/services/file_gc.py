@@ -0,0 +1,138 @@
+"""
+Background deletion of files uploaded to OpenAI for vision calls.
+
+Deleting a file right after the model call puts one more round trip on the
+path the student is waiting on. Instead file ids are queued here and a daemon
+thread deletes them in batches every DELETE_INTERVAL seconds. Uploaded files
+never expire on their own, so whatever is still queued is deleted on exit.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+import threading
+import time
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+#seconds between background deletion passes
+DELETE_INTERVAL = 60
+#deletes sent concurrently per pass
+DELETE_BATCH = 20
+#on exit every delete gets this timeout (no retries) and all of them together
+#EXIT_DELETE_BUDGET seconds, so a reload or shutdown never hangs on the files api
+EXIT_DELETE_TIMEOUT = 2.0
+EXIT_DELETE_BUDGET = 10.0
+
+
+class FileDeleter:
+    """
+    Queues OpenAI file ids and deletes them off the request path
+
+    Every file is deleted with the client that uploaded it, file ids only
+    work for the account they belong to. get_client returns the client for
+    files scheduled without one, it is only called once there is something
+    to delete. sweep, if given, is called on every pass and returns more
+    (file_id, client) pairs to delete (e.g. entries that expired out of an
+    upload cache). drain, if given, is called by close and returns every
+    pair still held elsewhere (e.g. the whole upload cache).
+    """
+
+    def __init__(
+        self,
+        get_client: Callable[[], Any],
+        interval: float = DELETE_INTERVAL,
+        sweep: Optional[Callable[[], List[Tuple[str, Any]]]] = None,
+        drain: Optional[Callable[[], List[Tuple[str, Any]]]] = None,
+    ):
+        self.get_client = get_client
+        self.interval = interval
+        self.sweep = sweep
+        self.drain = drain
+        self._pending = deque()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, file_id: str, client: Any = None) -> None:
+        """Queue a file for deletion on the next pass, client None means get_client()"""
+        self._pending.append((file_id, client))
+        self.start()
+
+    def start(self) -> None:
+        """Start the background thread (once)"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="openai-file-gc", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """
+        Delete everything queued (plus whatever sweep returns) now
+
+        Returns the number of files deleted.
+        """
+        files = self._collect(self.sweep)
+        if not files:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(DELETE_BATCH, len(files))) as executor:
+            deleted = sum(executor.map(self._delete, files))
+        logger.debug(f"Deleted {deleted}/{len(files)} vision files")
+        return deleted
+
+    def close(self, budget: float = EXIT_DELETE_BUDGET) -> int:
+        """
+        Delete everything queued plus everything drain returns, meant for atexit
+
+        Deletes one at a time, new threads can't be started at interpreter
+        shutdown. Each delete uses a short timeout without retries and the
+        whole pass stops after budget seconds, whatever is left is logged.
+        Returns the number of files deleted.
+        """
+        files = self._collect(self.drain)
+        if not files:
+            return 0
+
+        deadline = time.monotonic() + budget
+        exit_clients = {}
+        deleted = attempted = 0
+        for file_id, client in files:
+            if time.monotonic() >= deadline:
+                break
+            client = client or self.get_client()
+            if id(client) not in exit_clients:
+                exit_clients[id(client)] = client.with_options(timeout=EXIT_DELETE_TIMEOUT, max_retries=0)
+            deleted += self._delete((file_id, exit_clients[id(client)]))
+            attempted += 1
+
+        logger.info(f"Deleted {deleted}/{len(files)} vision files on exit")
+        if attempted < len(files):
+            logger.warning(f"Exit budget of {budget}s used up, {len(files) - attempted} vision files left undeleted")
+        return deleted
+
+    def _collect(self, source: Optional[Callable[[], List[Tuple[str, Any]]]]) -> List[Tuple[str, Any]]:
+        files = list(source()) if source else []
+        while self._pending:
+            files.append(self._pending.popleft())
+        return files
+
+    def _delete(self, item: Tuple[str, Any]) -> bool:
+        file_id, client = item
+        try:
+            (client or self.get_client()).files.delete(file_id)
+            return True
+        except Exception as e:
+            logger.debug(f"Could not delete vision file {file_id}: {e}")
+            return False
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Vision file cleanup failed: {e}")
@@ -7,19 +7,29 @@ It should handle both text and image input and return a response.
 
 """
 
+import heapq
 import os
+import secrets
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import chromadb
 from dotenv import load_dotenv
 
+from app.core.logger import get_logger
 from app.services.vision import VisionService
-from app.services.document_processor import chroma_client
+from app.services.document_processor import chroma_client, clear_retrieval_cache, clear_documents_cache
+from app.services.document_processor import process_document, embed_texts, embed_query, get_cached_results, cache_chunks, MAX_QUERY_WORKERS
+from app.services.document_processor import get_or_create_collection, normalize_query, vector_index
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
+SUPPORTED_IMAGE_TYPES = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'})
+
 class MultimodelProcessor:
     """
     MultimodelProcessor for the Interactive AI Tutor
@@ -28,11 +38,9 @@ class MultimodelProcessor:
     def __init__(self):
         self.chroma_client = chroma_client
         self.vision_service = VisionService()
-        self.supported_image_types = {
-            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'
-        }
+        self.supported_image_types = SUPPORTED_IMAGE_TYPES
 
-    def store_image_analysis(self, image_data: Dict) -> Optional[str]:
+    def store_image_analysis(self, image_data: Dict) -> Optional[Tuple[str, List[str]]]:
         """
         Stores image analysis in chromadb for semantic search
 
@@ -41,10 +49,12 @@ class MultimodelProcessor:
         3. stores gpt4 vision analysis as searchable text
         4. adds metadata for tracking content
 
+        Returns the collection name and the ids of the stored entries, so they
+        can be deleted individually later (see delete_documents).
         """
         try:
             if image_data["status"] != "success":
-                print(f"Failed to store image analysis: {image_data['error']}")
+                logger.error(f"Failed to store image analysis: {image_data['error']}")
                 return None
 
             document_name = image_data["document_name"]
@@ -52,10 +62,10 @@ class MultimodelProcessor:
             #create or get collection name
             collection_name = document_name.replace(" ", "_").replace(".", "_").replace("-", "_").lower()
 
-            #create or get collection
-            collection = self.chroma_client.get_or_create_collection(
-                name=collection_name,
-                metadata={
+            #create or get collection (handle is cached after the first image)
+            collection = get_or_create_collection(
+                collection_name,
+                {
                     "document_name": document_name,
                     "content_types": "multimodal",
                     "created_at": datetime.now().isoformat()
@@ -63,30 +73,34 @@ class MultimodelProcessor:
             )
 
             #generate unique id for image
-
-            import uuid
-            image_id = f"{document_name}_image_{uuid.uuid4().hex[:8]}"
+            image_id = f"{document_name}_image_{secrets.token_hex(4)}"
             #store the analysis as searchable text
-
+            documents = [image_data["analysis"]]
+            embeddings = embed_texts(documents)
+            metadatas = [{
+                "content_type": "image",
+                "source_type": "vision_analysis",
+                "image_path": image_data["image_path"],
+                "file_name": image_data["file_name"],
+                "file_size": image_data["file_size"],
+                "model_used": image_data["model_used"],
+                "document_name": document_name,
+                "processed_at": datetime.now().isoformat()
+            }]
 
             collection.add(
-                documents=[image_data["analysis"]],
+                documents=documents,
+                embeddings=embeddings,
                 ids=[image_id],
-                metadatas=[{
-                    "content_type": "image",
-                    "source_type": "vision_analysis",
-                    "image_path": image_data["image_path"],
-                    "file_name": image_data["file_name"],
-                    "file_size": image_data["file_size"],
-                    "model_used": image_data["model_used"],
-                    "document_name": document_name,
-                    "processed_at": datetime.now().isoformat()
-                }]
+                metadatas=metadatas
             )
+            clear_retrieval_cache()
+            clear_documents_cache()
+            vector_index.add(collection, [image_id], embeddings, documents, metadatas)
 
-            return collection_name
+            return collection_name, [image_id]
         except Exception as e:
-            print(f"Error storing image analysis: {e}")
+            logger.error(f"Error storing image analysis: {e}")
             return None
     
 
@@ -99,81 +113,72 @@ class MultimodelProcessor:
         2. Searches each collection for query
         3. combines and ranks results from all sources
         4. returns unified results from all documents and images.
+
+        Results are cached (shared with retrieve_relevant_chunks' cache), a
+        repeated or near identical query is answered without touching chroma.
         """
 
         try:
-            #get all collections
-
-            all_collections = self.chroma_client.list_collections()
-            if not all_collections:
+            cache_key = (normalize_query(query), top_k, "search")
+            cached = get_cached_results(cache_key)
+            if cached is None:
+                #embed the query once, it is reused for the cache lookup and every collection
+                query_embedding = embed_query(query)
+                cached = get_cached_results(cache_key, query_embedding)
+            if cached is not None:
+                results, stats = cached
                 return {
-                    "status": "error",
-                    "message": "No collections found",
-                    "error_code": "NO_COLLECTIONS_FOUND"
+                    "status": "success",
+                    "query": query,
+                    "total_collections_searched": stats["total_collections_searched"],
+                    "total_results": stats["total_results"],
+                    "results": results,
+                    "cached": True
                 }
 
-            all_results = []
-            for collection_info in all_collections:
-                # search collection -> process results -> append  to all_results
-                
-                try:
-                    collection = self.chroma_client.get_collection(name=collection_info.name)
-
-                    #search the collection
-                    results = collection.query(
-                        query_texts=[query],
-                        n_results=min(top_k, 10)
+            #exact scan over every stored vector in process, chroma is only
+            #queried when the index can't answer (e.g. too many vectors)
+            indexed = vector_index.search([query_embedding], top_k)
+            if indexed is not None:
+                hits, collections_searched, total_results = indexed
+                final_results = [self._result_item(*hit) for hit in hits[0]]
+            else:
+                #get all collections
+
+                all_collections = self.chroma_client.list_collections()
+                if not all_collections:
+                    return {
+                        "status": "error",
+                        "message": "No collections found",
+                        "error_code": "NO_COLLECTIONS_FOUND"
+                    }
+
+                #query every collection concurrently, chroma queries are read only
+                with ThreadPoolExecutor(max_workers=min(MAX_QUERY_WORKERS, len(all_collections))) as executor:
+                    per_collection = executor.map(
+                        lambda collection_info: self._search_collection(collection_info, query_embedding, top_k),
+                        all_collections,
                     )
+                    all_results = [result for results in per_collection for result in results]
 
-                    documents = results["documents"][0]
-                    metadatas = results["metadatas"][0]
-                    distances = results.get("distances", [None])[0]
-
-
-                    for i in range(len(documents)):
-                        # loop through the results and get the metadata for each result
-                        # metadatas is a list of dictionaries where each dictionary contains
-                        # the metadata for a single result (e.g. document name, content type, etc.)
-                        # we use the index i to access the metadata for the current result
-                        metadata = metadatas[i]
-                        content_type = metadata.get("content_type", "text")
-                        result_item = {
-                            "content": documents[i],
-                            "content_type": content_type,
-                            "similarity_score": 1 - distances[i] if distances and distances[i] is not None else None,
-                            "collection_name": collection_info.name,
-                            "document_name": metadata.get("document_name", collection_info.name),
-                            "metadata": metadata
-                        }
-                        if content_type == "image":
-                            result_item['source_info'] = {
-                                "type":"Image Analysis",
-                                "file_name": metadata.get("file_name", "Unknown"),
-                                "model_used": metadata.get("model_used", "Unknown"),
-                                "image_path": metadata.get("image_path", "Unknown")
-                            }
-                        else:
-                            result_item['source_info'] = {
-                                "type":"Text Chunk",
-                                "chunk_id": metadata.get("chunk_id", "Unknown"),
-                            }
-                        all_results.append(result_item)
-
-                except Exception as e:
-                    print(f"Error searching collection {collection_info.name}: {e}")
-            #sort all results by similarity score
-            all_results.sort(key=lambda x: x['similarity_score'] or 0, reverse=True)
-            final_results = all_results[:top_k]
+                #take the top_k by similarity score without sorting every result
+                final_results = heapq.nlargest(top_k, all_results, key=lambda x: x['similarity_score'] or 0)
+                collections_searched, total_results = len(all_collections), len(all_results)
 
 
             for i, results in enumerate(final_results):
                 results['rank'] = i + 1
-            
+
+            cache_chunks(cache_key, query_embedding, final_results, {
+                "total_collections_searched": collections_searched,
+                "total_results": total_results,
+            })
+
             return{
                 "status": "success",
                 "query": query,
-                "total_collections_searched": len(all_collections),
-                "total_results": len(all_results),
+                "total_collections_searched": collections_searched,
+                "total_results": total_results,
                 "results": final_results
             }
         except Exception as e:
@@ -183,11 +188,165 @@ class MultimodelProcessor:
                 "error": str(e),
                 "error_code": "SEARCH_ERROR"
             }
-            
-            
-                    
-            
-    
+
+    def search_content_batch(self, queries:List[str], top_k:int=5) -> List[Dict]:
+        """
+        search_content for several queries at once
+
+        Queries missing from the cache are embedded in one encoder forward pass
+        and scored together against the vector index (or, past its limit, sent
+        to each collection as a single multi-embedding chroma query).
+        Returns one search_content style result per query, in the same order.
+        """
+        try:
+            responses: List[Optional[Dict]] = [None] * len(queries)
+            cache_keys = [(normalize_query(query), top_k, "search") for query in queries]
+
+            #one exact lookup per query, only the misses are embedded (an entry
+            #can expire at any point, so it is never looked up twice exactly)
+            cached_results = {i: get_cached_results(key) for i, key in enumerate(cache_keys)}
+            misses = [i for i, cached in cached_results.items() if cached is None]
+            embeddings = dict(zip(misses, embed_texts([cache_keys[i][0] for i in misses]))) if misses else {}
+            for i in misses:
+                #a near identical question may already be cached
+                cached_results[i] = get_cached_results(cache_keys[i], embeddings[i])
+
+            for i, cached in cached_results.items():
+                if cached is not None:
+                    results, stats = cached
+                    responses[i] = {
+                        "status": "success",
+                        "query": queries[i],
+                        "total_collections_searched": stats["total_collections_searched"],
+                        "total_results": stats["total_results"],
+                        "results": results,
+                        "cached": True
+                    }
+            to_search = [i for i in range(len(queries)) if responses[i] is None]
+            if not to_search:
+                return responses
+
+            query_embeddings = [embeddings[i] for i in to_search]
+            indexed = vector_index.search(query_embeddings, top_k)
+            if indexed is not None:
+                hits, collections_searched, total_results = indexed
+                per_query = [([self._result_item(*hit) for hit in query_hits], total_results) for query_hits in hits]
+            else:
+                all_collections = self.chroma_client.list_collections()
+                if not all_collections:
+                    error = {
+                        "status": "error",
+                        "message": "No collections found",
+                        "error_code": "NO_COLLECTIONS_FOUND"
+                    }
+                    return [response or dict(error) for response in responses]
+
+                with ThreadPoolExecutor(max_workers=min(MAX_QUERY_WORKERS, len(all_collections))) as executor:
+                    per_collection = list(executor.map(
+                        lambda collection_info: self._search_collection_batch(collection_info, query_embeddings, top_k),
+                        all_collections,
+                    ))
+
+                per_query = []
+                for position in range(len(to_search)):
+                    all_results = [result for results in per_collection for result in results[position]]
+                    final_results = heapq.nlargest(top_k, all_results, key=lambda x: x['similarity_score'] or 0)
+                    per_query.append((final_results, len(all_results)))
+                collections_searched = len(all_collections)
+
+            for i, (final_results, total_results) in zip(to_search, per_query):
+                for rank, result in enumerate(final_results):
+                    result['rank'] = rank + 1
+
+                cache_chunks(cache_keys[i], embeddings[i], final_results, {
+                    "total_collections_searched": collections_searched,
+                    "total_results": total_results,
+                })
+                responses[i] = {
+                    "status": "success",
+                    "query": queries[i],
+                    "total_collections_searched": collections_searched,
+                    "total_results": total_results,
+                    "results": final_results
+                }
+            return responses
+        except Exception as e:
+            return [
+                {
+                    "status": "error",
+                    "query": query,
+                    "error": str(e),
+                    "error_code": "SEARCH_ERROR"
+                }
+                for query in queries
+            ]
+
+    def _search_collection(self, collection_info, query_embedding:List[float], top_k:int) -> List[Dict]:
+        """
+        Search a single collection, returning its results (or [] if the query fails)
+        """
+        return self._search_collection_batch(collection_info, [query_embedding], top_k)[0]
+
+    def _search_collection_batch(self, collection_info, query_embeddings:List[List[float]], top_k:int) -> List[List[Dict]]:
+        """
+        Search a single collection for several queries in one chroma call,
+        returning one result list per query (all [] if the query fails)
+        """
+        # search collection -> process results
+        try:
+            #list_collections already returned a usable handle, and the queries are
+            #passed as embeddings so the handle's embedding function never runs
+            collection = collection_info
+
+            #search the collection
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                #top_k per collection is exactly enough for the global top_k
+                n_results=top_k
+            )
+
+            distances = results.get("distances") or [None] * len(query_embeddings)
+            return [
+                self._collection_results(collection_info, documents, metadatas, query_distances)
+                for documents, metadatas, query_distances in zip(results["documents"], results["metadatas"], distances)
+            ]
+
+        except Exception as e:
+            logger.warning(f"Error searching collection {collection_info.name}: {e}")
+            return [[] for _ in query_embeddings]
+
+    def _collection_results(self, collection_info, documents:List[str], metadatas:List[Dict], distances:Optional[List[float]]) -> List[Dict]:
+        # metadatas is a list of dictionaries where each dictionary contains
+        # the metadata for a single result (e.g. document name, content type, etc.)
+        return [
+            self._result_item(collection_info.name, documents[i], metadatas[i], distances[i] if distances else None)
+            for i in range(len(documents))
+        ]
+
+    def _result_item(self, collection_name:str, document:str, metadata:Dict, distance:Optional[float]) -> Dict:
+        content_type = metadata.get("content_type", "text")
+        result_item = {
+            "content": document,
+            "content_type": content_type,
+            "similarity_score": 1 - distance if distance is not None else None,
+            "collection_name": collection_name,
+            "document_name": metadata.get("document_name", collection_name),
+            "metadata": metadata
+        }
+        if content_type == "image":
+            result_item['source_info'] = {
+                "type":"Image Analysis",
+                "file_name": metadata.get("file_name", "Unknown"),
+                "model_used": metadata.get("model_used", "Unknown"),
+                "image_path": metadata.get("image_path", "Unknown")
+            }
+        else:
+            result_item['source_info'] = {
+                "type":"Text Chunk",
+                "chunk_id": metadata.get("chunk_id", "Unknown"),
+            }
+        return result_item
+
     def get_status(self) -> Dict:
         """
         Returns the status of the multimodal processor.
@@ -268,9 +427,7 @@ class MultimodelProcessor:
             if not document_name:
                 document_name = image_path_obj.stem
             
-            print(f"Image file: {file_name}")
-            print(f"File size: {file_size}")
-            print(f"Document name: {document_name}")
+            logger.info(f"Image file: {file_name}, size: {file_size}, document name: {document_name}")
 
 
             #analyze image
@@ -320,9 +477,7 @@ class MultimodelProcessor:
                     "error_code": "FILE_NOT_FOUND"
                 }
             #use existing process_document method
-            from document_processor import process_document
-
-            print(f"processing dpdf using existing pipeline: {pdf_path}")
+            logger.info(f"Processing PDF using existing pipeline: {pdf_path}")
 
             result = process_document(pdf_path)
 
@@ -369,9 +524,9 @@ class MultimodelProcessor:
             elif file_extension in self.supported_image_types:
                 image_result = self.process_image(file_path, document_name)
                 if image_result['status'] == 'success':
-                    collection_name = self.store_image_analysis(image_result)
-                    if collection_name:
-                        image_result["vector_collection"] = collection_name
+                    stored = self.store_image_analysis(image_result)
+                    if stored:
+                        image_result["vector_collection"] = stored[0]
                 return image_result
             else:
                 return {
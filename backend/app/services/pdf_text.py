@@ -0,0 +1,79 @@
+"""
+PDF page text extraction, kept apart from document_processor so the worker
+processes that extract large PDFs only import pypdfium2 (spawned workers
+re-import the module of the function they run, and document_processor pulls
+in chromadb, torch and the sentence transformer).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+from typing import List, Tuple
+
+import pypdfium2 as pdfium
+
+#worker processes shared by every large pdf, started on first use
+PDF_WORKERS = os.cpu_count() or 1
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def extract_page_range(page_range: Tuple[str, int, int]) -> str:
+    """
+    Extract text from pages [start, stop) of a PDF file.
+
+    Opens its own document handle so it can run in a worker process
+    (pdfium handles can't be pickled).
+
+    Args:
+        page_range (Tuple[str, int, int]): (file_path, start, stop)
+
+    Returns:
+        str: Extracted text, one trailing newline per page.
+    """
+    file_path, start, stop = page_range
+    parts = []
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        for index in range(start, stop):
+            #close textpage/page explicitly, pdfium handles are not freed eagerly otherwise
+            page = pdf[index]
+            textpage = page.get_textpage()
+            parts.append(textpage.get_text_range().replace("\r\n", "\n"))
+            parts.append("\n")
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return "".join(parts)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    The shared extraction pool. Workers are spawned, not forked: the server
+    process holds threads, torch and sqlite/chroma handles that a fork would
+    copy (and could deadlock on).
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def extract_page_ranges(page_ranges: List[Tuple[str, int, int]]) -> str:
+    """
+    Extract several page ranges on the shared pool, concatenated in order.
+    Falls back to extracting in this process if the pool has died.
+    """
+    global _pool
+    try:
+        return "".join(_get_pool().map(extract_page_range, page_ranges))
+    except BrokenProcessPool:
+        #a worker was killed (e.g. out of memory), start a fresh pool next time
+        with _pool_lock:
+            _pool = None
+        return "".join(map(extract_page_range, page_ranges))
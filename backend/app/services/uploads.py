@@ -0,0 +1,32 @@
+"""
+Saving uploaded files to disk, shared by the /upload and /steps routers.
+
+Uploads are copied in fixed size chunks so memory stays at one chunk no
+matter how large the file is. The copy is blocking file io, so it runs in a
+worker thread instead of on the event loop.
+"""
+
+import asyncio
+import shutil
+from pathlib import Path
+
+from fastapi import UploadFile
+
+#bytes copied per read when saving an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_upload(upload_file: UploadFile, path: Path) -> int:
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload_file.file, buffer, UPLOAD_CHUNK_SIZE)
+        return buffer.tell()
+
+
+async def save_upload(upload_file: UploadFile, path: Path) -> int:
+    """
+    Streams an uploaded file to path
+
+    Returns:
+        int: Number of bytes written
+    """
+    return await asyncio.to_thread(_copy_upload, upload_file, path)
@@ -0,0 +1,316 @@
+"""
+Exact in-process search over every embedding stored in chroma
+
+For the collection sizes this app sees, a chroma query per collection (plus
+its hnsw bookkeeping) costs far more than the distance math itself. The index
+loads every stored embedding once into a single contiguous float32 matrix and
+scores a query against all of it in one call: simsimd when it is installed,
+a numpy matmul otherwise.
+
+Distances are chroma's default "l2" space (squared euclidean), so results
+rank and score exactly like collection.query.
+
+Given a path, the matrix is also saved as a .npy file (the row ids in a json
+sidecar) and memory mapped on the next start, so a restart doesn't read every
+embedding back out of chroma. Documents and metadata are still read from
+chroma, they are small next to the embeddings. The saved copy is only used
+while the embedding model, every collection's id and a digest of its stored
+ids still match.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+from app.core.logger import get_logger
+logger = get_logger(__name__)
+
+#above this many stored vectors searches go back to chroma's hnsw index
+MAX_BRUTE_FORCE_VECTORS = 100_000
+
+#rows the matrix is allocated with on first growth, it doubles from there
+MIN_CAPACITY = 1024
+
+#rows appended since the last save after which the matrix is written again
+SAVE_EVERY_ROWS = 1000
+
+#(collection name, document, metadata, distance)
+Hit = Tuple[str, str, Dict, float]
+
+
+def _ids_digest(ids: List[str]) -> str:
+    """
+    Fingerprint of a collection's contents. Rows are only ever added or
+    deleted (chroma ignores an add for an existing id), so the id set changes
+    whenever the content does.
+    """
+    return hashlib.sha256("\n".join(sorted(ids)).encode()).hexdigest()
+
+
+class VectorIndex:
+    """
+    Every chroma embedding as one (N, D) float32 matrix, with the collection
+    name, id, document and metadata of each row kept in parallel lists
+
+    Loaded on first search. Rows stored afterwards are appended with add()
+    (the matrix has spare capacity and doubles when it runs out), anything
+    else that changes chroma calls invalidate(). search() returns None
+    whenever chroma should answer instead (too many vectors, nothing stored,
+    or the load failed).
+    """
+
+    def __init__(self, chroma_client, path: Optional[str] = None, model_name: Optional[str] = None, max_vectors: int = MAX_BRUTE_FORCE_VECTORS):
+        self.chroma_client = chroma_client
+        self.path = path
+        self.model_name = model_name
+        self.max_vectors = max_vectors
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._loaded = False
+        #rows [0, _count) of _vectors/_sq_norms are filled, the rest is spare capacity
+        self._vectors = None
+        self._sq_norms = None
+        self._count = 0
+        self._names: List[str] = []
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._keys = set()
+        self._sizes: Dict[str, int] = {}
+        self._collection_ids: Dict[str, str] = {}
+        self._saved_count = 0
+
+    def invalidate(self) -> None:
+        """Drop the loaded matrix, the next search reloads it from chroma"""
+        with self._lock:
+            self._reset()
+
+    def add(self, collection, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]) -> None:
+        """
+        Append rows that were just stored in chroma (in collection), instead of reloading
+
+        Falls back to invalidate() when the index isn't loaded, would grow past
+        max_vectors, or already has one of the ids (chroma keeps the old row).
+        """
+        collection_name = collection.name
+        with self._lock:
+            try:
+                if self._vectors is None or any((collection_name, row_id) in self._keys for row_id in ids):
+                    self._reset()
+                    return
+
+                rows = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), self._vectors.shape[1])
+                start, end = self._count, self._count + len(rows)
+                if end > self.max_vectors:
+                    self._reset()
+                    return
+                if end > len(self._vectors):
+                    self._grow(max(end, 2 * len(self._vectors), MIN_CAPACITY))
+
+                #searches only read rows below _count, so filling spare capacity is safe
+                self._vectors[start:end] = rows
+                self._sq_norms[start:end] = np.einsum("ij,ij->i", rows, rows)
+                self._names.extend([collection_name] * len(ids))
+                self._ids.extend(ids)
+                self._documents.extend(documents)
+                self._metadatas.extend(metadatas)
+                self._keys.update((collection_name, row_id) for row_id in ids)
+                self._sizes[collection_name] = self._sizes.get(collection_name, 0) + len(ids)
+                self._collection_ids[collection_name] = str(collection.id)
+                self._count = end
+
+                if end - self._saved_count >= SAVE_EVERY_ROWS:
+                    self._save()
+            except Exception as e:
+                logger.warning(f"Could not append to vector index, reloading on next search: {e}")
+                self._reset()
+
+    def _grow(self, capacity: int) -> None:
+        """Move the filled rows into a bigger matrix. Callers must hold _lock."""
+        vectors = np.empty((capacity, self._vectors.shape[1]), dtype=np.float32)
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        vectors[:self._count] = self._vectors[:self._count]
+        sq_norms[:self._count] = self._sq_norms[:self._count]
+        self._vectors, self._sq_norms = vectors, sq_norms
+
+    def save(self) -> None:
+        """Write the matrix to path now (e.g. on shutdown), if it is loaded"""
+        with self._lock:
+            if self._vectors is not None and self._count != self._saved_count:
+                self._save()
+
+    def _save(self) -> None:
+        """Callers must hold _lock."""
+        if not self.path:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            matrix_path = os.path.join(self.path, "embeddings.npy")
+            rows_path = os.path.join(self.path, "rows.json")
+            #write next to the real files and swap them in, a crash mid-write
+            #leaves the previous copy intact
+            with open(matrix_path + ".tmp", "wb") as f:
+                np.save(f, self._vectors[:self._count])
+            names, ids = self._names[:self._count], self._ids[:self._count]
+            collection_rows: Dict[str, List[str]] = {name: [] for name in self._sizes}
+            for name, row_id in zip(names, ids):
+                collection_rows[name].append(row_id)
+            with open(rows_path + ".tmp", "wb") as f:
+                f.write(orjson.dumps({
+                    "model_name": self.model_name,
+                    "collections": {name: [self._collection_ids.get(name), _ids_digest(row_ids)] for name, row_ids in collection_rows.items()},
+                    "names": names,
+                    "ids": ids,
+                }))
+            os.replace(matrix_path + ".tmp", matrix_path)
+            os.replace(rows_path + ".tmp", rows_path)
+            self._saved_count = self._count
+            logger.debug(f"Vector index saved: {self._count} vectors")
+        except Exception as e:
+            logger.warning(f"Could not save vector index: {e}")
+
+    def _load_saved(self, collection_ids: Dict[str, str], stored: Dict[str, Dict]) -> bool:
+        """
+        Memory map the saved matrix if it still matches chroma (stored is
+        collection name -> collection.get result without embeddings). Callers
+        must hold _lock.
+        """
+        matrix_path = os.path.join(self.path, "embeddings.npy")
+        rows_path = os.path.join(self.path, "rows.json")
+        if not (os.path.exists(matrix_path) and os.path.exists(rows_path)):
+            return False
+        collections = {name: [collection_ids[name], _ids_digest(stored[name]["ids"] if name in stored else [])] for name in collection_ids}
+        try:
+            with open(rows_path, "rb") as f:
+                saved = orjson.loads(f.read())
+            if saved["model_name"] != self.model_name or saved["collections"] != collections:
+                logger.info("Saved vector index is out of date, reloading from chroma")
+                return False
+
+            #read only, pages are faulted in by the first scan. add() copies
+            #into a writable matrix when it needs room
+            vectors = np.load(matrix_path, mmap_mode="r")
+            if vectors.shape[0] != len(saved["ids"]):
+                return False
+
+            #chroma doesn't promise a row order, line its rows up with the saved ones
+            rows = {
+                (name, row_id): (document, metadata)
+                for name, data in stored.items()
+                for row_id, document, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+            }
+            documents, metadatas = zip(*(rows[key] for key in zip(saved["names"], saved["ids"]))) if rows else ((), ())
+        except Exception as e:
+            logger.warning(f"Could not read saved vector index: {e}")
+            return False
+
+        self._vectors = vectors
+        self._sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        self._count = self._saved_count = len(vectors)
+        self._names, self._ids = saved["names"], saved["ids"]
+        self._documents, self._metadatas = list(documents), list(metadatas)
+        self._keys = set(zip(self._names, self._ids))
+        self._sizes = {name: len(stored[name]["ids"]) if name in stored else 0 for name in collection_ids}
+        self._collection_ids = collection_ids
+        logger.info(f"Vector index loaded from {self.path}: {self._count} vectors")
+        return True
+
+    def _load(self) -> None:
+        """Read every collection into the matrix. Callers must hold _lock."""
+        self._loaded = True
+        collections = self.chroma_client.list_collections()
+        sizes = {collection.name: collection.count() for collection in collections}
+        if not sizes or sum(sizes.values()) > self.max_vectors:
+            return
+        collection_ids = {collection.name: str(collection.id) for collection in collections}
+        if self.path:
+            #everything but the embeddings, the ids tell whether the saved matrix is current
+            stored = {
+                collection.name: collection.get(include=["documents", "metadatas"])
+                for collection in collections
+                if sizes[collection.name]
+            }
+            if self._load_saved(collection_ids, stored):
+                return
+
+        rows, names, ids, documents, metadatas = [], [], [], [], []
+        for collection in collections:
+            if not sizes[collection.name]:
+                continue
+            data = collection.get(include=["embeddings", "documents", "metadatas"])
+            rows.extend(data["embeddings"])
+            names.extend([collection.name] * len(data["ids"]))
+            ids.extend(data["ids"])
+            documents.extend(data["documents"])
+            metadatas.extend(data["metadatas"])
+        if not rows:
+            return
+
+        vectors = np.ascontiguousarray(rows, dtype=np.float32)
+        self._sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        self._vectors = vectors
+        self._count = len(rows)
+        self._names, self._ids, self._documents, self._metadatas = names, ids, documents, metadatas
+        self._keys = set(zip(names, ids))
+        self._sizes = sizes
+        self._collection_ids = collection_ids
+        logger.info(f"Vector index loaded: {len(rows)} vectors from {len(sizes)} collections")
+        self._save()
+
+    @staticmethod
+    def _distances(queries: np.ndarray, vectors: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+        """(Q, N) squared euclidean distances from each query to every row"""
+        if simsimd is not None:
+            return np.asarray(simsimd.cdist(queries, vectors, metric="sqeuclidean"), dtype=np.float32)
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+        return query_sq_norms[:, None] + sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+
+    def search(self, query_embeddings: List[List[float]], top_k: int) -> Optional[Tuple[List[List[Hit]], int, int]]:
+        """
+        Exact top_k over every stored vector for each query
+
+        Returns (hits per query, collections searched, total results) where
+        total results counts what per-collection chroma queries would have
+        returned, or None if chroma should be queried instead.
+        """
+        try:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                #add() only writes past _count and invalidate() swaps in new
+                #objects, so the scan can run outside the lock
+                vectors, sq_norms, count = self._vectors, self._sq_norms, self._count
+                names, documents, metadatas, sizes = self._names, self._documents, self._metadatas, dict(self._sizes)
+            if vectors is None:
+                return None
+            if top_k <= 0:
+                #argpartition would get kth=-1, nothing is asked for anyway
+                return [[] for _ in query_embeddings], len(sizes), 0
+            vectors, sq_norms = vectors[:count], sq_norms[:count]
+
+            queries = np.ascontiguousarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+            distances = self._distances(queries, vectors, sq_norms)
+        except Exception as e:
+            logger.warning(f"Vector index unavailable, querying chroma: {e}")
+            return None
+
+        k = min(top_k, count)
+        all_hits = []
+        for row_distances in distances:
+            top = np.argpartition(row_distances, k - 1)[:k] if k < count else np.arange(k)
+            top = top[np.argsort(row_distances[top], kind="stable")]
+            all_hits.append([(names[i], documents[i], metadatas[i], float(row_distances[i])) for i in top])
+
+        total_results = sum(min(top_k, size) for size in sizes.values())
+        return all_hits, len(sizes), total_results
@@ -1,17 +1,29 @@
-from openai import OpenAI
-import os
+import asyncio
 from app.core.logger import get_logger
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from io import BytesIO
 import requests
+#uploaded files are deleted in the background (not on the request path) by the same deleter
+from vision_analyzer import VisionAnalyzer, vision_analyzer, file_deleter
 logger = get_logger(__name__)
 
 
 class VisionService:
     def __init__(self, api_key:Optional[str] = None, model_name:Optional[str] = "gpt-4.1-mini"):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        #clients come from a VisionAnalyzer: built on first use, the async one (and
+        #the concurrency limit) per event loop. agents build a VisionService per
+        #request, so the default shares the process wide analyzer and its connections
+        self.analyzer = VisionAnalyzer(api_key=api_key) if api_key else vision_analyzer
         self.model_name = model_name
 
+    @property
+    def client(self):
+        return self.analyzer.client
+
+    @property
+    def async_client(self):
+        return self.analyzer.async_client
+
     def create_file_for_vision(self, image_path:str) -> Optional[str]:
         try:
             if image_path.startswith("http"):
@@ -48,41 +60,39 @@ class VisionService:
                     "error": "Failed to create file for vision",
                 }
             
-            response = self.client.responses.create(
-                model=self.model_name,
-                input=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": prompt},
-                            {
-                                "type": "input_image",
-                                "file_id": file_id,
-                            },
-                        ],
-                    }
-                ],
-                text={"verbosity": verbosity}
-            )
-            
-            analysis = response.output_text
-            if analysis:
-                logger.info("image analysis generated successfully")
-            else:
-                logger.error("image analysis failed")
-            
-            try:
-                self.client.files.delete(file_id)
-            except Exception as e:
-                pass
+            response = self.client.responses.create(**self._analysis_request(file_id, prompt, verbosity))
+            file_deleter.schedule(file_id, self.client)
             
+            return self._analysis_result(response.output_text, image_path, prompt)
+        except Exception as e:
+            logger.error(f"Error analyzing image: {e}")
             return {
-                "success": True,
-                "analysis": analysis,
+                "success": False,
+                "error": str(e),
                 "image_path": image_path,
-                "prompt": prompt,
-                "model": self.model_name,
-            }    
+                "analysis": None,
+            }
+
+    async def analyze_image_async(self, image_path, prompt:str, verbosity:str = "medium") -> Dict:
+        """
+        Same as analyze_image, but awaits the model call instead of blocking on it.
+        At most MAX_CONCURRENT_VISION_REQUESTS run at once per event loop, shared
+        with vision_analyzer's calls.
+        """
+        try:
+            async with self.analyzer._limit():
+                #the upload may download from blob storage first, keep it off the event loop
+                file_id = await asyncio.to_thread(self.create_file_for_vision, image_path)
+                if not file_id:
+                    return {
+                        "success": False,
+                        "error": "Failed to create file for vision",
+                    }
+
+                response = await self.async_client.responses.create(**self._analysis_request(file_id, prompt, verbosity))
+            file_deleter.schedule(file_id, self.client)
+
+            return self._analysis_result(response.output_text, image_path, prompt)
         except Exception as e:
             logger.error(f"Error analyzing image: {e}")
             return {
@@ -91,11 +101,56 @@ class VisionService:
                 "image_path": image_path,
                 "analysis": None,
             }
+
+    async def analyze_images(self, image_paths: List[str], prompt: str, verbosity: str = "medium") -> List[Dict]:
+        """
+        Analyze several images with the same prompt concurrently (capped by
+        analyze_image_async's per loop limit)
+
+        Returns one analyze_image style result per path, in the same order.
+        """
+        return await asyncio.gather(*(
+            self.analyze_image_async(image_path, prompt, verbosity)
+            for image_path in image_paths
+        ))
+
+    def _analysis_request(self, file_id: str, prompt: str, verbosity: str) -> Dict:
+        return {
+            "model": self.model_name,
+            "input": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": prompt},
+                        {
+                            "type": "input_image",
+                            "file_id": file_id,
+                        },
+                    ],
+                }
+            ],
+            "text": {"verbosity": verbosity},
+        }
+
+    def _analysis_result(self, analysis: str, image_path, prompt: str) -> Dict:
+        if analysis:
+            logger.info("image analysis generated successfully")
+        else:
+            logger.error("image analysis failed")
+
+        return {
+            "success": True,
+            "analysis": analysis,
+            "image_path": image_path,
+            "prompt": prompt,
+            "model": self.model_name,
+        }
     def get_image_summary(self, image_path: str) -> str:
         """Quick summary of an image"""
         result = self.analyze_image(
             image_path=image_path,
-            prompt="Provide a brief 2-3 sentence summary of this image."
+            prompt="Provide a brief 2-3 sentence summary of this image.",
+            verbosity="low"
         )
         return result.get("analysis", "") if result.get("success") else f"Error: {result.get('error')}"
     
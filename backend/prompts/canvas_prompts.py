@@ -38,6 +38,53 @@ Return ONLY JSON. Example:
 
 
 
+# JSON schema the annotation response is constrained to (structured outputs),
+# mirrors the rules in ANNOTATION_PROMPT so the model can't return anything else
+_UNIT_INTERVAL = {"type": "number", "minimum": 0.0, "maximum": 1.0}
+
+ANNOTATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "annotations": {
+            "type": "array",
+            "maxItems": 5,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["highlight"]},
+                    "topLeft": {
+                        "type": "object",
+                        "properties": {"x": _UNIT_INTERVAL, "y": _UNIT_INTERVAL},
+                        "required": ["x", "y"],
+                        "additionalProperties": False,
+                    },
+                    "width": _UNIT_INTERVAL,
+                    "height": _UNIT_INTERVAL,
+                    "colorHex": {"type": "string", "pattern": "^#[0-9A-Fa-f]{6}$"},
+                    "opacity": _UNIT_INTERVAL,
+                },
+                "required": ["type", "topLeft", "width", "height", "colorHex", "opacity"],
+                "additionalProperties": False,
+            },
+        },
+        "metadata": {
+            "type": "object",
+            "properties": {
+                "problem_type": {"type": "string"},
+                "context": {"type": "string"},
+                "confidence": {"type": "string", "enum": ["high", "medium", "low"]},
+            },
+            "required": ["problem_type", "context", "confidence"],
+            "additionalProperties": False,
+        },
+    },
+    "required": ["annotations", "metadata"],
+    "additionalProperties": False,
+}
+
+
+
+
 DETECTION_PROMPT = """Analyze this student's whiteboard/canvas work and identify:
 
 1. **Problem Type**: Classify as ONE of these:
@@ -146,11 +193,14 @@ PROBLEM_TYPE_PROMPTS = {
 def get_canvas_prompt(problem_type: str, context: str = None) -> str:
     """
     Get the improved structured Pocket Professor prompt for canvas analysis.
+
+    The per-student context goes after the static prompt so every request of a
+    problem type shares the same prefix (lets the provider's prompt cache hit).
     """
     base_prompt = PROBLEM_TYPE_PROMPTS.get(problem_type, PROBLEM_TYPE_PROMPTS["general"])
 
     if context:
-        return f"Context: {context}\n\n{base_prompt}"
+        return f"{base_prompt}\nContext: {context}\n"
 
     return base_prompt
 
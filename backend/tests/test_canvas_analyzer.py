@@ -0,0 +1,60 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from canvas_analyzer import CanvasAnalyzer
+
+
+def test_structure_feedback_plain_headers():
+    feedback = CanvasAnalyzer()._structure_feedback(
+        "PROBLEM: Solve x^2 - 4 = 0\n"
+        "ANALYSIS: Factored correctly\n"
+        "into (x-2)(x+2)\n"
+        "HINTS:\n- Set each factor to zero\n- Check both roots\n"
+        "NEXT_STEP: Solve x - 2 = 0\n"
+        "MISTAKES:\n"
+        "ENCOURAGEMENT: Nice work!",
+        "math",
+    )
+
+    assert feedback.problem == "Solve x^2 - 4 = 0"
+    assert feedback.analysis == "Factored correctly\ninto (x-2)(x+2)"
+    assert feedback.hints == ["Set each factor to zero", "Check both roots"]
+    assert feedback.next_step == "Solve x - 2 = 0"
+    assert feedback.mistakes == []
+    assert feedback.encouragement == "Nice work!"
+
+
+def test_structure_feedback_decorated_headers():
+    """Markdown bold/heading and indented headers are recognised like plain ones"""
+    feedback = CanvasAnalyzer()._structure_feedback(
+        "Here is my feedback.\n"
+        "**PROBLEM:** Balance H2 + O2 -> H2O\n"
+        "### ANALYSIS: Hydrogen is balanced\n"
+        "  HINTS:\n"
+        "- Count the oxygen atoms\n"
+        "**NEXT_STEP**: Put a 2 in front of H2O\n",
+        "chemistry",
+    )
+
+    assert feedback.problem == "Balance H2 + O2 -> H2O"
+    assert feedback.analysis == "Hydrogen is balanced"
+    assert feedback.hints == ["Count the oxygen atoms"]
+    assert feedback.next_step == "Put a 2 in front of H2O"
+
+
+def test_structure_feedback_unknown_header_stays_in_section():
+    feedback = CanvasAnalyzer()._structure_feedback(
+        "HINTS:\n- Draw a free body diagram\n"
+        "Note: this was a tricky one\n"
+        "ENCOURAGEMENT: Keep going",
+        "physics",
+    )
+
+    assert feedback.hints == ["Draw a free body diagram", "Note: this was a tricky one"]
+    assert feedback.encouragement == "Keep going"
@@ -12,6 +12,14 @@ def test_modern_clip():
         model, _, preprocess = open_clip.create_model_and_transforms('ViT-B-32', pretrained='openai')
         tokenizer = open_clip.get_tokenizer('ViT-B-32')
 
+        #half precision on gpu (bfloat16 where supported, it doesn't overflow like fp16), fp32 on cpu
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        if device == "cuda":
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        else:
+            dtype = torch.float32
+        model = model.to(device=device, dtype=dtype).eval()
+
         print("Model loaded successfully.")
         print(f"Device: {next(model.parameters()).device}")
 
@@ -19,13 +27,15 @@ def test_modern_clip():
         #test with dummy data
         print("Testing with dummy data...")
 
-        #testing with a dog image
+        #testing with a batch of images, encoded in a single forward pass
         try:
-            dog_image = Image.open("dog.jpeg")
-            print(f"loaded dog image with size: {dog_image.size} pixels")
+            image_paths = ["dog.jpeg", "Fig09.jpg"]
+            images = [Image.open(path).convert("RGB") for path in image_paths]
+            for path, image in zip(image_paths, images):
+                print(f"loaded {path} with size: {image.size} pixels")
 
-            #preprocess image for clip
-            image_input = preprocess(dog_image).unsqueeze(0)
+            #preprocess images for clip, stacked into one (N, 3, 224, 224) batch
+            image_input = torch.stack([preprocess(image) for image in images], dim=0).to(device=device, dtype=dtype)
             print(f"Image input shape: {image_input.shape}")
 
             #create test descriptions
@@ -37,33 +47,35 @@ def test_modern_clip():
                 "A photo of a monkey",
             ]
 
-            text_input = tokenizer(text_descriptions)
+            text_input = tokenizer(text_descriptions).to(device)
 
 
             #get embeddings
-            with torch.no_grad():
-                image_features = model.encode_image(image_input)
+            with torch.inference_mode():
+                #the label set is fixed, so the text side is encoded once for every image
                 text_features = model.encode_text(text_input)
+                text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+
+                image_features = model.encode_image(image_input)
                 print(f"Image features shape: {image_features.shape}")
                 print(f"Text features shape: {text_features.shape}")
 
                 #normalize features
                 image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-
-                #compute similarity
-                similarities = (100.0* image_features @ text_features.T).softmax(dim=-1)
 
-                print("Similarities:")
-                for i, (desc, prob) in enumerate(zip(text_descriptions, similarities[0])):
-                    print(f" {desc:12}: {prob:.4f} ({prob*100:.1f}%)")
+                #compute similarity, one row per image (in fp32, the 100x logit scale can overflow half precision)
+                similarities = (100.0* image_features.float() @ text_features.float().T).softmax(dim=-1)
 
-                best_match_idx = similarities.argmax()
-                best_match = text_descriptions[best_match_idx]
-                confidence = similarities[0][best_match_idx]
+                for path, image_similarities in zip(image_paths, similarities):
+                    print(f"\nSimilarities for {path}:")
+                    for desc, prob in zip(text_descriptions, image_similarities):
+                        print(f" {desc:12}: {prob:.4f} ({prob*100:.1f}%)")
 
+                    best_match_idx = image_similarities.argmax()
+                    best_match = text_descriptions[best_match_idx]
+                    confidence = image_similarities[best_match_idx]
 
-                print(f"\n🏆 Best match: '{best_match}' with {confidence*100:.1f}% confidence")
+                    print(f"\n🏆 Best match: '{best_match}' with {confidence*100:.1f}% confidence")
 
 
 
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 
@@ -24,7 +25,27 @@ def test_vision_analyzer():
         print(f"Error testing vision analyzer: {e}")
 
 
+def test_vision_analyzer_batch():
+    print("testing batched vision analyzer...")
+    try:
+        vision_service = VisionService()
+        image_paths = [
+            "/Users/pranavkandikonda/Documents/AI/InteractiveAITutor/backend/uploads/QuadEquationTest.jpg",
+        ] * 3
+        #all images are analyzed concurrently instead of one round trip after another
+        results = asyncio.run(vision_service.analyze_images(
+            image_paths,
+            "Tell me what is going on in this image",
+            "medium"
+        ))
+        for result in results:
+            print(result["analysis"])
+    except Exception as e:
+        print(f"Error testing batched vision analyzer: {e}")
+
+
 if __name__ == "__main__":
     test_vision_analyzer()
+    test_vision_analyzer_batch()
 
     
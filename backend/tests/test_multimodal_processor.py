@@ -8,6 +8,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from multimodel_processor import MultimodelProcessor
+from app.services.document_processor import delete_documents
 
 
 def test_multimodal_pipeline():
@@ -33,10 +34,11 @@ def test_multimodal_pipeline():
     
 
     print("storing in chromadb...")
-    collection_name = processor.store_image_analysis(image_result)
-    if not collection_name:
+    stored = processor.store_image_analysis(image_result)
+    if not stored:
         print("Error storing image analysis")
         return False
+    collection_name, doc_ids = stored
     
     print(f"Image analysis stored successfully in {collection_name}")
 
@@ -47,9 +49,11 @@ def test_multimodal_pipeline():
         "describe the appearance"
     ]
 
-    for query in queries:
+    #all queries embedded in one forward pass and searched with one chroma call per collection
+    all_results = processor.search_content_batch(queries, top_k=2)
+
+    for query, search_results in zip(queries, all_results):
         print(f"\n\nQuery: {query}")
-        search_results = processor.search_content(query, top_k=2)
         if search_results['status'] == "success":
             print(f"found {search_results['total_results']} results from {search_results['total_collections_searched']} collections")
 
@@ -61,9 +65,11 @@ def test_multimodal_pipeline():
                     break
         else:
             print("search failed")
-    #clean up
-
-    processor.chroma_client.delete_collection(name=collection_name)
+    #clean up: delete only the entries this test added, dropping the whole
+    #collection would throw away its hnsw index and force a re-index next run.
+    #(for a fully throwaway store, point the processor at chromadb.EphemeralClient()
+    #instead and skip cleanup entirely)
+    delete_documents(collection_name, doc_ids)
     return True
 
 
@@ -0,0 +1,283 @@
+import asyncio
+import os
+import sys
+from collections import OrderedDict
+from io import BytesIO
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from PIL import Image
+
+import vision_analyzer
+from app.services.file_gc import FileDeleter
+from vision_analyzer import VisionAnalyzer, VISION_DOWNSCALE_MIN_BYTES, VISION_MAX_SIDE, _prepare_upload
+
+
+TEST_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dog.jpeg")
+
+
+class FakeAsyncOpenAI:
+    """Stands in for AsyncOpenAI, records the loop it was created on and the requests in flight"""
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.output_text = "analysis"
+        self.error = None
+        self.responses = SimpleNamespace(create=self._create)
+        FakeAsyncOpenAI.instances.append(self)
+
+    async def _create(self, **request):
+        assert asyncio.get_running_loop() is self.loop
+        if self.error:
+            raise self.error
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(output_text=self.output_text)
+
+    async def close(self):
+        self.closed = True
+
+
+def _fake_client(monkeypatch, **attrs):
+    """Patches AsyncOpenAI, every client created afterwards gets attrs set"""
+    FakeAsyncOpenAI.instances = []
+
+    def create(**kwargs):
+        fake = FakeAsyncOpenAI(**kwargs)
+        fake.__dict__.update(attrs)
+        return fake
+    monkeypatch.setattr(vision_analyzer, "AsyncOpenAI", create)
+
+
+async def _file_id(image_path):
+    return "file-test"
+
+
+async def _no_file_id(image_path):
+    return None
+
+
+def test_detection_parses_vision_result(monkeypatch):
+    analyzer = VisionAnalyzer()
+    _fake_client(monkeypatch, output_text="PROBLEM_TYPE: physics\nCONTEXT: projectile motion\nCONFIDENCE: high")
+    monkeypatch.setattr(analyzer, "acreate_file_for_vision", _file_id)
+
+    result = asyncio.run(analyzer.adetect_problem_type_and_context(TEST_IMAGE))
+
+    assert result["success"] is True
+    assert result["problem_type"] == "physics"
+    assert result["context"] == "projectile motion"
+    assert result["confidence"] == "high"
+
+
+def test_detection_failure(monkeypatch):
+    """A failed upload or vision call comes back as an error result, not an exception"""
+    analyzer = VisionAnalyzer()
+    _fake_client(monkeypatch, error=RuntimeError("vision api unavailable"))
+    monkeypatch.setattr(analyzer, "acreate_file_for_vision", _no_file_id)
+    assert asyncio.run(analyzer.adetect_problem_type_and_context(TEST_IMAGE))["error"] == "Failed to create file for vision"
+
+    monkeypatch.setattr(analyzer, "acreate_file_for_vision", _file_id)
+    result = asyncio.run(analyzer.adetect_problem_type_and_context(TEST_IMAGE))
+
+    assert result["success"] is False
+    assert result["problem_type"] is None
+    assert result["error"] == "vision api unavailable"
+
+
+def test_batch_analyze_on_separate_event_loops(monkeypatch):
+    """Each event loop gets its own client and semaphore, and the semaphore caps requests in flight"""
+    analyzer = VisionAnalyzer()
+    _fake_client(monkeypatch)
+    monkeypatch.setattr(vision_analyzer, "MAX_CONCURRENT_VISION_REQUESTS", 2)
+    monkeypatch.setattr(analyzer, "acreate_file_for_vision", _file_id)
+    paths = [f"image-{i}.png" for i in range(6)]
+
+    first = asyncio.run(analyzer.batch_analyze(paths))
+    second = asyncio.run(analyzer.batch_analyze(paths))
+
+    assert [result["image_path"] for result in first] == paths
+    assert all(result["success"] for result in first + second)
+    assert len(FakeAsyncOpenAI.instances) == 2
+    assert all(fake.max_in_flight == 2 for fake in FakeAsyncOpenAI.instances)
+
+
+def test_sync_methods_use_the_sync_client(monkeypatch):
+    """The sync methods never build an async client or event loop, so they also work inside a running loop"""
+    analyzer = VisionAnalyzer(api_key="test-key")
+    _fake_client(monkeypatch)
+    requests = []
+
+    def create(**request):
+        requests.append(request)
+        return SimpleNamespace(output_text="PROBLEM_TYPE: math\nCONTEXT: fractions\nCONFIDENCE: low")
+
+    analyzer._client = SimpleNamespace(responses=SimpleNamespace(create=create))
+    monkeypatch.setattr(analyzer, "create_file_for_vision", lambda image_path: "file-test")
+
+    async def in_running_loop():
+        return analyzer.analyze_image(TEST_IMAGE), analyzer.detect_problem_type_and_context(TEST_IMAGE)
+
+    analysis, detection = asyncio.run(in_running_loop())
+
+    assert analysis["success"] is True
+    assert analysis["image_path"] == TEST_IMAGE
+    assert detection["problem_type"] == "math"
+    assert detection["context"] == "fractions"
+    assert len(requests) == 2
+    assert FakeAsyncOpenAI.instances == []
+    assert len(analyzer._loops) == 0
+
+
+def test_upload_cache_is_per_api_key(monkeypatch):
+    """A file uploaded under one account is never handed to another account's requests"""
+    uploads = []
+
+    async def create(file, purpose):
+        uploads.append(file)
+        return SimpleNamespace(id=f"file-{len(uploads)}")
+
+    _fake_client(monkeypatch, files=SimpleNamespace(create=create))
+    monkeypatch.setattr(vision_analyzer, "_vision_files", OrderedDict())
+    monkeypatch.setattr(vision_analyzer.file_deleter, "start", lambda: None)
+    first, second = VisionAnalyzer(api_key="key-a"), VisionAnalyzer(api_key="key-b")
+
+    assert asyncio.run(first.acreate_file_for_vision(TEST_IMAGE)) == "file-1"
+    assert asyncio.run(first.acreate_file_for_vision(TEST_IMAGE)) == "file-1"
+    assert asyncio.run(second.acreate_file_for_vision(TEST_IMAGE)) == "file-2"
+    assert len(uploads) == 2
+
+
+def test_upload_cache_hit_restarts_ttl(monkeypatch):
+    """An image that keeps being used never expires out from under a call"""
+    now = [1000.0]
+    monkeypatch.setattr(vision_analyzer.time, "time", lambda: now[0])
+    monkeypatch.setattr(vision_analyzer, "_vision_files", OrderedDict())
+    monkeypatch.setattr(vision_analyzer.file_deleter, "start", lambda: None)
+    key = ("key-a", "digest")
+
+    vision_analyzer._cache_file_id(key, "file-1", None)
+    now[0] += vision_analyzer.VISION_FILE_TTL - 1
+    assert vision_analyzer._cached_file_id(key) == "file-1"
+    now[0] += vision_analyzer.VISION_FILE_TTL - 1
+
+    assert vision_analyzer._expired_file_ids() == []
+    assert vision_analyzer._cached_file_id(key) == "file-1"
+
+
+def test_file_deleter_close_deletes_with_owning_client(monkeypatch):
+    """On exit queued and drained files are deleted, each with the client that uploaded it"""
+    deleted = []
+
+    def client(name):
+        fake = SimpleNamespace(files=SimpleNamespace(delete=lambda file_id: deleted.append((name, file_id))))
+        fake.with_options = lambda **options: fake
+        return fake
+
+    deleter = FileDeleter(lambda: client("default"), drain=lambda: [("file-cached", client("key-b"))])
+    monkeypatch.setattr(deleter, "start", lambda: None)
+    deleter.schedule("file-default")
+    deleter.schedule("file-a", client("key-a"))
+
+    assert deleter.close() == 3
+    assert sorted(deleted) == [("default", "file-default"), ("key-a", "file-a"), ("key-b", "file-cached")]
+
+
+def test_file_deleter_close_stops_at_its_budget(monkeypatch):
+    deleted = []
+    client = SimpleNamespace(files=SimpleNamespace(delete=deleted.append))
+    client.with_options = lambda **options: client
+    deleter = FileDeleter(lambda: client, drain=lambda: [(f"file-{i}", None) for i in range(3)])
+
+    assert deleter.close(budget=0) == 0
+    assert deleted == []
+
+
+def _noise_image(size, mode="RGB") -> Image.Image:
+    #random pixels don't compress, so the encoded file is well over VISION_DOWNSCALE_MIN_BYTES
+    return Image.frombytes(mode, size, os.urandom(size[0] * size[1] * len(mode)))
+
+
+def _encode(image: Image.Image, format: str, **kwargs) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def test_prepare_upload_keeps_small_images():
+    data = _encode(Image.new("RGB", (64, 64), "white"), "JPEG")
+    assert _prepare_upload("small.jpg", data) == ("small.jpg", data)
+
+
+def test_prepare_upload_downscales_png_as_png():
+    data = _encode(_noise_image((2400, 1200)), "PNG")
+    assert len(data) > VISION_DOWNSCALE_MIN_BYTES
+
+    filename, upload = _prepare_upload("canvas.png", data)
+
+    with Image.open(BytesIO(upload)) as image:
+        assert filename == "canvas.png"
+        assert image.format == "PNG"
+        assert max(image.size) == VISION_MAX_SIDE
+
+
+def test_prepare_upload_applies_exif_orientation():
+    #landscape pixels tagged "rotate 90 cw", i.e. a portrait phone photo
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = _encode(_noise_image((2000, 1000)), "JPEG", quality=95, exif=exif)
+    assert len(data) > VISION_DOWNSCALE_MIN_BYTES
+
+    filename, upload = _prepare_upload("photo.jpeg", data)
+
+    with Image.open(BytesIO(upload)) as image:
+        assert filename == "photo.jpg"
+        width, height = image.size
+        assert height > width
+        assert image.getexif().get(0x0112, 1) == 1
+
+
+def test_prepare_upload_flattens_transparency_for_jpeg():
+    image = _noise_image((1600, 1600), "RGBA")
+    image.paste((0, 0, 0, 0), (0, 0, 100, 100))
+    data = _encode(image, "WEBP", lossless=True)
+    assert len(data) > VISION_DOWNSCALE_MIN_BYTES
+
+    filename, upload = _prepare_upload("drawing.webp", data)
+
+    with Image.open(BytesIO(upload)) as result:
+        assert filename == "drawing.jpg"
+        assert result.mode == "RGB"
+        #fully transparent corner becomes white, not black
+        assert min(result.getpixel((5, 5))) > 240
+
+
+def test_vision_service_shares_per_loop_clients(monkeypatch):
+    """VisionService uses the analyzer's per loop client and limit, so it works across asyncio.run calls"""
+    from app.services.vision import VisionService
+
+    service = VisionService(api_key="test-key")
+    _fake_client(monkeypatch)
+    monkeypatch.setattr(vision_analyzer, "MAX_CONCURRENT_VISION_REQUESTS", 2)
+    monkeypatch.setattr(service, "create_file_for_vision", lambda image_path: "file-test")
+    monkeypatch.setattr(vision_analyzer.file_deleter, "schedule", lambda file_id, client=None: None)
+    paths = [f"image-{i}.png" for i in range(5)]
+
+    for _ in range(2):
+        results = asyncio.run(service.analyze_images(paths, "describe"))
+        assert [result["image_path"] for result in results] == paths
+        assert all(result["success"] for result in results)
+
+    assert len(FakeAsyncOpenAI.instances) == 2
+    assert all(fake.max_in_flight == 2 for fake in FakeAsyncOpenAI.instances)
@@ -1,17 +1,242 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import httpx
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import atexit
+import hashlib
 import os
-from typing import Optional, Dict
+import re
+import threading
+import time
+import weakref
+from typing import Optional, Dict, List, Literal, Tuple
 from dotenv import load_dotenv
-from prompts.canvas_prompts import get_vision_prompt, DETECTION_PROMPT
-import base64
-import json
+from prompts.canvas_prompts import get_vision_prompt, DETECTION_PROMPT, ANNOTATION_SCHEMA
+from PIL import Image, ImageOps
+from io import BytesIO
+import orjson
 
 from app.core.logger import get_logger
+from app.services.file_gc import FileDeleter
 logger = get_logger(__name__)
 
 
 load_dotenv()
 
+OPENAI_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+
+@lru_cache(maxsize=None)
+def get_client() -> OpenAI:
+    """
+    One sync client per process, every VisionAnalyzer (and VisionService) shares
+    its connection pool. Built on first use, so importing this module doesn't
+    fail when OPENAI_API_KEY isn't set. Async clients are per event loop, see
+    VisionAnalyzer._loop_state
+    """
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=2)
+
+#max vision requests the async methods keep in flight at once, per event loop (provider rate limits)
+MAX_CONCURRENT_VISION_REQUESTS = 10
+
+#output settings per kind of call: short answers get low verbosity and a token cap,
+#output tokens are generated one at a time so they dominate the latency.
+#annotate is uncapped so the schema constrained json can't get cut off
+OUTPUT_MODES = {
+    "summary": {"verbosity": "low", "max_output_tokens": 120},
+    "detect": {"verbosity": "low", "max_output_tokens": 100},
+    "full": {"verbosity": "medium", "max_output_tokens": None},
+    "annotate": {"verbosity": "medium", "max_output_tokens": None},
+}
+SUMMARY_QUERY = "Provide a brief 2-3 sentence summary of the image."
+
+#values the detection fields may take, anything else falls back to the defaults
+VALID_PROBLEM_TYPES = frozenset({"math", "physics", "chemistry", "diagram"})
+VALID_CONFIDENCE = frozenset({"high", "medium", "low"})
+
+#annotation responses are constrained to ANNOTATION_SCHEMA, so they always parse
+ANNOTATION_TEXT_FORMAT = {
+    "type": "json_schema",
+    "name": "annotations",
+    "schema": ANNOTATION_SCHEMA,
+    "strict": True,
+}
+
+#one "FIELD: value" line of the DETECTION_PROMPT response
+_DETECTION_FIELD_RE = re.compile(r"^[ \t]*(PROBLEM_TYPE|CONTEXT|CONFIDENCE):(.*)", re.M)
+
+
+#coercers for annotation fields: (value, default) -> cleaned value, None drops the annotation
+def _unit(value, default):
+    """clamp to [0, 1]"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    if 0.0 <= value <= 1.0:
+        return value
+    return 0.0 if value < 0.0 else 1.0
+
+
+def _extent(value, default):
+    """a width/height, must be in (0, 1]"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if 0.0 < value <= 1.0 else None
+
+
+def _point(value, default):
+    """{"x", "y"} clamped to the canvas, missing coordinates are 0"""
+    if not isinstance(value, dict):
+        value = {}
+    return {"x": _unit(value.get("x", 0.0), 0.0), "y": _unit(value.get("y", 0.0), 0.0)}
+
+
+def _text(value, default):
+    return value if isinstance(value, str) else default
+
+
+#annotation type -> (output field, response field, coercer, default) per field.
+#supporting a new shape means adding it here and to ANNOTATION_SCHEMA
+_SHAPES = {
+    "highlight": (
+        ("top_left", "topLeft", _point, None),
+        ("width", "width", _extent, None),
+        ("height", "height", _extent, None),
+        ("colorHex", "colorHex", _text, "#FFFF00"),
+        ("opacity", "opacity", _unit, 0.25),
+    ),
+}
+
+
+def _validate_annotation(ann: Dict, spec: Tuple) -> Optional[Dict]:
+    """Clean one annotation against its _SHAPES spec, None if it has to be dropped"""
+    annotation = {"type": ann["type"]}
+    for field, source, coerce, default in spec:
+        value = coerce(ann.get(source, default), default)
+        if value is None:
+            return None
+        annotation[field] = value
+    return annotation
+
+
+#uploaded vision files by (api key, sha256 of their bytes) -> (file_id, expires_at, client), process wide
+#so every call on the same image (analyze, detect, annotate, follow-up questions) shares one upload.
+#entries expire VISION_FILE_TTL after their last use
+#the api key is part of the key because a file id only works for the account that uploaded it,
+#and the sync client of that account is kept to delete the file with
+VISION_FILE_CACHE_SIZE = 256
+VISION_FILE_TTL = 20 * 60
+_vision_files: "OrderedDict[Tuple[Optional[str], str], Tuple[str, float, OpenAI]]" = OrderedDict()
+_vision_files_lock = threading.Lock()
+
+#images are downscaled to this long side before upload, the model resizes larger ones
+#down anyway so extra pixels only cost upload time; files under the size are sent as is
+VISION_MAX_SIDE = 1568
+VISION_DOWNSCALE_MIN_BYTES = 200 * 1024
+VISION_JPEG_QUALITY = 85
+
+
+def _cached_file_id(key: Tuple[Optional[str], str]) -> Optional[str]:
+    with _vision_files_lock:
+        entry = _vision_files.get(key)
+        if entry is None:
+            return None
+        file_id, expires_at, client = entry
+        now = time.time()
+        if expires_at < now:
+            del _vision_files[key]
+            file_deleter.schedule(file_id, client)
+            return None
+        #a hit restarts the ttl, so an image in use is never swept while a call is using it
+        _vision_files[key] = (file_id, now + VISION_FILE_TTL, client)
+        _vision_files.move_to_end(key)
+        return file_id
+
+
+def _cache_file_id(key: Tuple[Optional[str], str], file_id: str, client: OpenAI) -> None:
+    with _vision_files_lock:
+        _vision_files[key] = (file_id, time.time() + VISION_FILE_TTL, client)
+        _vision_files.move_to_end(key)
+        while len(_vision_files) > VISION_FILE_CACHE_SIZE:
+            _, (evicted_id, _, evicted_client) = _vision_files.popitem(last=False)
+            file_deleter.schedule(evicted_id, evicted_client)
+    #expired entries are swept by the deleter's background pass
+    file_deleter.start()
+
+
+def _expired_file_ids() -> List[Tuple[str, OpenAI]]:
+    with _vision_files_lock:
+        now = time.time()
+        expired = [key for key, (_, expires_at, _) in _vision_files.items() if expires_at < now]
+        return [(file_id, client) for file_id, _, client in map(_vision_files.pop, expired)]
+
+
+def _all_file_ids() -> List[Tuple[str, OpenAI]]:
+    with _vision_files_lock:
+        files = [(file_id, client) for file_id, _, client in _vision_files.values()]
+        _vision_files.clear()
+        return files
+
+
+#uploaded files are never deleted inline, evicted/expired ones are deleted in the background.
+#they don't expire on the openai side, so the queue and the whole cache are deleted on exit
+file_deleter = FileDeleter(get_client, sweep=_expired_file_ids, drain=_all_file_ids)
+atexit.register(file_deleter.close)
+
+
+def _read_image(image_path: str) -> Tuple[bytes, str]:
+    with open(image_path, "rb") as file_content:
+        data = file_content.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """RGB copy for jpeg encoding, transparent areas become white instead of black"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _prepare_upload(image_path: str, data: bytes) -> Tuple[str, bytes]:
+    """
+    Filename and bytes to upload for an image: large images are shrunk to
+    VISION_MAX_SIDE, png stays png (sharp edges on handwriting/diagrams),
+    everything else is re-encoded as jpeg
+    """
+    filename = os.path.basename(image_path)
+    if len(data) <= VISION_DOWNSCALE_MIN_BYTES:
+        return filename, data
+
+    try:
+        with Image.open(BytesIO(data)) as image:
+            is_png = image.format == "PNG"
+            #re-encoding drops the exif orientation tag, so phone photos have to be
+            #rotated upright first or they'd reach the model sideways
+            rotated = image.getexif().get(0x0112, 1) != 1
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((VISION_MAX_SIDE, VISION_MAX_SIDE), Image.LANCZOS)
+            buffer = BytesIO()
+            if is_png:
+                image.save(buffer, format="PNG", optimize=True)
+            else:
+                _to_rgb(image).save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY)
+    except Exception as e:
+        logger.warning(f"Could not downscale {image_path}, uploading original: {e}")
+        return filename, data
+
+    #the original is only kept if it is smaller and still carries its orientation
+    if buffer.tell() >= len(data) and not rotated:
+        return filename, data
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.png" if is_png else f"{stem}.jpg", buffer.getvalue()
+
 class VisionAnalyzer:
 
 
@@ -20,16 +245,50 @@ class VisionAnalyzer:
 
     Integrates with RAG system for multi modal response
     """
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key:Optional[str] = None):
+        #None uses OPENAI_API_KEY and the shared sync client
+        self.api_key = api_key
+        self._client = None
         self.model_name = "gpt-4.1-mini"
-
-    
+        #event loop -> (AsyncOpenAI, Semaphore). both bind to the loop they are
+        #first used on, so every loop (each asyncio.run, each worker) gets its own
+        self._loops = weakref.WeakKeyDictionary()
+
+    def _loop_state(self) -> Tuple[AsyncOpenAI, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = (
+                AsyncOpenAI(api_key=self.api_key or os.getenv("OPENAI_API_KEY"), timeout=OPENAI_TIMEOUT, max_retries=2),
+                asyncio.Semaphore(MAX_CONCURRENT_VISION_REQUESTS),
+            )
+        return state
+
+    @property
+    def client(self) -> OpenAI:
+        """Sync OpenAI client, built on first use"""
+        if not self.api_key:
+            return get_client()
+        if self._client is None:
+            self._client = OpenAI(api_key=self.api_key, timeout=OPENAI_TIMEOUT, max_retries=2)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client for the running event loop"""
+        return self._loop_state()[0]
+
+    def _limit(self) -> asyncio.Semaphore:
+        """Caps the vision requests in flight on the running event loop"""
+        return self._loop_state()[1]
 
     def create_file_for_vision(self, image_path:str) -> Optional[str]:
         """
         Uploads image file to openai for vision analysis
 
+        Uploads are cached by api key and content hash, so the same image is only
+        uploaded once per account and VISION_FILE_TTL no matter how many calls use it. Large images
+        are downscaled first (see _prepare_upload).
 
         args:
             image_path (str): Path to the image file.
@@ -38,87 +297,205 @@ class VisionAnalyzer:
             Optional[str]: File ID if successful, None otherwise.
 
         """
+        try:
+            data, digest = _read_image(image_path)
+            key = (self.api_key, digest)
+            file_id = _cached_file_id(key)
+            if file_id:
+                return file_id
+
+            result = self.client.files.create(
+                file=_prepare_upload(image_path, data),
+                purpose="vision"
+            )
+            _cache_file_id(key, result.id, self.client)
+            return result.id
+        except Exception as e:
+            logger.error(f"Error creating file for vision: {e}")
+            return None
 
+    async def acreate_file_for_vision(self, image_path:str) -> Optional[str]:
+        """
+        Async version of create_file_for_vision
+        """
         try:
-            with open(image_path, "rb") as file_content:
-                result = self.client.files.create(
-                    file=file_content,
-                    purpose="vision"
-                )
-                return result.id
+            data, digest = await asyncio.to_thread(_read_image, image_path)
+            key = (self.api_key, digest)
+            file_id = _cached_file_id(key)
+            if file_id:
+                return file_id
+
+            upload = await asyncio.to_thread(_prepare_upload, image_path, data)
+            result = await self.async_client.files.create(
+                file=upload,
+                purpose="vision"
+            )
+            _cache_file_id(key, result.id, self.client)
+            return result.id
         except Exception as e:
             logger.error(f"Error creating file for vision: {e}")
             return None
 
+    def purge_cache(self) -> int:
+        """
+        Deletes uploaded vision files that expired or fell out of the upload cache
+        right away instead of waiting for the background pass
+
+        returns:
+            int: Number of files deleted.
+        """
+        return file_deleter.flush()
+
     
-    def analyze_image(self, image_path:str, user_query:str = None)-> Dict:
+    def analyze_image(self, image_path:str, user_query:str = None, mode:Literal["full", "summary"] = "full")-> Dict:
         """
         COmprehensive analysis of image using GPT 4.1 mini vision model.
 
         Args:
             image_path (str): Path to the image file.
             user_query (str, optional): User query for the image. Defaults to None.
+            mode (str, optional): "full" or "summary" (short, capped output). Defaults to "full".
 
         Returns:
             Dict: Analysis results.
         """
-
-
         try:
-            #create file for vision
             file_id = self.create_file_for_vision(image_path)
             if not file_id:
                 return {"error": "Failed to create file for vision", "analysis": None}
-            
-            prompt = get_vision_prompt(user_query)
-            #call gpt4.1 mini api
-            response = self.client.responses.create(
-                model = self.model_name,
-                input = [{
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": prompt},
-                        {
-                            "type": "input_image",
-                            "file_id": file_id,
-                        },
-                    ],
-                }],
-                #reasoning = {"effort": "minimal"},
-                text= {"verbosity":"medium"}
-            )
 
-            analysis = response.output_text
-            if analysis:
-                logger.info("image analysis generated successfully")
-            else:
-                logger.error("image analysis failed")
+            result = self._analyze_image_part({"type": "input_image", "file_id": file_id}, user_query, mode)
+            result["image_path"] = image_path
+            return result
 
-            #clean up and delete the uploaded file
+        except Exception as e:
+            logger.error(f"Error analyzing image: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "image_path": image_path,
+                "analysis": None,
+            }
 
-            try:
-                self.client.files.delete(file_id)
-                
-            except Exception as e:
-                pass
+    async def aanalyze_image(self, image_path:str, user_query:str = None, mode:Literal["full", "summary"] = "full") -> Dict:
+        """
+        Async version of analyze_image, at most MAX_CONCURRENT_VISION_REQUESTS run at once
+        """
+        try:
+            async with self._limit():
+                file_id = await self.acreate_file_for_vision(image_path)
+                if not file_id:
+                    return {"error": "Failed to create file for vision", "analysis": None}
+
+                response = await self.async_client.responses.create(
+                    **self._vision_request(prompt=get_vision_prompt(user_query), image_part={"type": "input_image", "file_id": file_id}, mode=mode)
+                )
 
+            result = self._analysis_result(response.output_text, user_query)
+            result["image_path"] = image_path
+            return result
+
+        except Exception as e:
+            logger.error(f"Error analyzing image: {e}")
             return {
-                "success": True,
-                "analysis": analysis,
+                "success": False,
+                "error": str(e),
                 "image_path": image_path,
-                "query": user_query,
-                "model": self.model_name,
+                "analysis": None,
             }
-            
+
+    async def batch_analyze(self, image_paths:List[str], user_queries:Optional[List[str]] = None) -> List[Dict]:
+        """
+        Analyze several images concurrently
+
+        args:
+            image_paths (List[str]): Paths to the image files.
+            user_queries (List[str], optional): One query per image. Defaults to None.
+
+        returns:
+            List[Dict]: One analyze_image style result per path, in the same order.
+        """
+        if user_queries is None:
+            user_queries = [None] * len(image_paths)
+        return await asyncio.gather(*(
+            self.aanalyze_image(image_path, user_query)
+            for image_path, user_query in zip(image_paths, user_queries)
+        ))
+
+    def analyze_image_from_bytes(self, image_b64:str, user_query:str = None, mime_type:str = "image/png") -> Dict:
+        """
+        Same as analyze_image, but takes an already base64 encoded image so callers
+        that make several vision calls on one image only read/encode it once.
+
+        Args:
+            image_b64 (str): Base64 encoded image bytes.
+            user_query (str, optional): User query for the image. Defaults to None.
+            mime_type (str, optional): Mime type of the image. Defaults to "image/png".
+
+        Returns:
+            Dict: Analysis results.
+        """
+        try:
+            return self._analyze_image_part(self._inline_image_part(image_b64, mime_type), user_query)
         except Exception as e:
             logger.error(f"Error analyzing image: {e}")
             return {
                 "success": False,
                 "error": str(e),
-                "image_path": image_path,
                 "analysis": None,
             }
 
+    def _analyze_image_part(self, image_part:Dict, user_query:str = None, mode:str = "full") -> Dict:
+        prompt = get_vision_prompt(user_query)
+        #call gpt4.1 mini api
+        response = self.client.responses.create(**self._vision_request(prompt, image_part, mode=mode))
+        return self._analysis_result(response.output_text, user_query)
+
+    def _vision_request(self, prompt:str, image_part:Dict, text_format:Optional[Dict] = None, mode:str = "full") -> Dict:
+        #shared by the sync and async clients
+        output = OUTPUT_MODES[mode]
+        text = {"verbosity": output["verbosity"]}
+        if text_format:
+            text["format"] = text_format
+        request = {
+            "model": self.model_name,
+            "input": [{
+                "role": "user",
+                "content": [
+                    {"type": "input_text", "text": prompt},
+                    image_part,
+                ],
+            }],
+            #"reasoning": {"effort": "minimal"},
+            "text": text,
+        }
+        if output["max_output_tokens"]:
+            request["max_output_tokens"] = output["max_output_tokens"]
+        return request
+
+    def _analysis_result(self, analysis:str, user_query:str = None) -> Dict:
+        if analysis:
+            logger.info("image analysis generated successfully")
+        else:
+            logger.error("image analysis failed")
+
+        return {
+            "success": True,
+            "analysis": analysis,
+            "query": user_query,
+            "model": self.model_name,
+        }
+
+    @staticmethod
+    def _inline_image_part(image_b64:str, mime_type:str = "image/png", detail:Optional[str] = None) -> Dict:
+        part = {
+            "type": "input_image",
+            "image_url": f"data:{mime_type};base64,{image_b64}",
+        }
+        if detail:
+            part["detail"] = detail
+        return part
+
 
     def get_image_summary(self, image_path:str) -> str:
         """
@@ -131,7 +508,7 @@ class VisionAnalyzer:
             str: Summary of the image.
         """
 
-        result = self.analyze_image(image_path, user_query="Provide a brief 2-3 sentence summary of the image.")
+        result = self.analyze_image(image_path, user_query=SUMMARY_QUERY, mode="summary")
         if result["success"]:
             return result["analysis"]
         else:
@@ -146,58 +523,88 @@ class VisionAnalyzer:
 
         returns:
             Dict: Dictionary containing the problem type and context.
-        """    
+        """
         try:
-            #create file for vision
-            file_id= self.create_file_for_vision(image_path)
-            if not file_id: 
+            file_id = self.create_file_for_vision(image_path)
+            if not file_id:
                 return {
                     "success": False,
                     "error": "Failed to create file for vision",
                     "problem_type": None,
                     "context": None,
                 }
+            return self._detect_image_part({"type": "input_image", "file_id": file_id})
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "problem_type": None,
+                "context": None,
+            }
 
-            #specialized prompt for detecting the problem type and context
-            prompt = DETECTION_PROMPT
-
-            #call gpt4.1 mini api
-            response = self.client.responses.create(
-                model = self.model_name,
-                input = [{
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": prompt},
-                        {
-                            "type": "input_image",
-                            "file_id": file_id,
-                        },
-                    ],
-                }],
-                #reasoning = {"effort": "minimal"},
-                text = {"verbosity": "medium"}
-            )
+    async def adetect_problem_type_and_context(self, image_path:str) -> Dict:
+        """
+        Async version of detect_problem_type_and_context
+        """
+        try:
+            async with self._limit():
+                file_id = await self.acreate_file_for_vision(image_path)
+                if not file_id:
+                    result = {
+                        "success": False,
+                        "error": "Failed to create file for vision",
+                        "problem_type": None,
+                        "context": None,
+                    }
+                else:
+                    response = await self.async_client.responses.create(
+                        **self._vision_request(DETECTION_PROMPT, {"type": "input_image", "file_id": file_id}, mode="detect")
+                    )
+                    result = self._detection_result(response.output_text)
 
-            analysis = response.output_text
-            #clean up file
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e),
+                "problem_type": None,
+                "context": None,
+            }
+        return result
 
-            try:
-                self.client.files.delete(file_id)
-            except Exception as e:
-                pass
+    def detect_problem_type_and_context_from_bytes(self, image_b64:str, mime_type:str = "image/png") -> Dict:
+        """
+        Same as detect_problem_type_and_context, but takes an already base64 encoded image
 
-            result = self._parse_detection_response(analysis)
-            result['success'] = True
-            return result
+        args:
+            image_b64 (str): Base64 encoded image bytes.
+            mime_type (str, optional): Mime type of the image. Defaults to "image/png".
 
+        returns:
+            Dict: Dictionary containing the problem type and context.
+        """
+        try:
+            return self._detect_image_part(self._inline_image_part(image_b64, mime_type))
         except Exception as e:
-            
             return {
                 "success": False,
                 "error": str(e),
                 "problem_type": None,
                 "context": None,
             }
+
+    def _detect_image_part(self, image_part:Dict) -> Dict:
+        #specialized prompt for detecting the problem type and context
+        prompt = DETECTION_PROMPT
+
+        #call gpt4.1 mini api
+        response = self.client.responses.create(**self._vision_request(prompt, image_part, mode="detect"))
+        return self._detection_result(response.output_text)
+
+    def _detection_result(self, analysis:str) -> Dict:
+        result = self._parse_detection_response(analysis)
+        result['success'] = True
+        return result
+
     def _parse_detection_response(self, response: str) -> Dict:
         """
         Parses the detection response and returns a dictionary containing the problem type and context
@@ -210,28 +617,23 @@ class VisionAnalyzer:
         """
 
         try: 
-            lines= response.strip().split("\n")
             result={
                 "problem_type": "general",
                 "context": None,
                 "confidence": "medium",
             }
 
-
-            for line in lines:
-                line = line.strip()
-                if line.startswith("PROBLEM_TYPE:"):
-                    problem_type = line.split(":", 1)[1].strip().lower()
-                    if problem_type in ["math", "physics", "chemistry", "diagram"]:
-                        result["problem_type"] = problem_type
-                    else:
-                        result["problem_type"] = "general"
-                elif line.startswith("CONTEXT:"):
-                    context = line.split(":", 1)[1].strip()
-                    result["context"] = context if context else None
-                elif line.startswith("CONFIDENCE:"):
-                    confidence = line.split(":", 1)[1].strip().lower()
-                    if confidence in ["high", "medium", "low"]:
+            #later lines win, same as reading the response top to bottom
+            for field, value in _DETECTION_FIELD_RE.findall(response):
+                value = value.strip()
+                if field == "PROBLEM_TYPE":
+                    problem_type = value.lower()
+                    result["problem_type"] = problem_type if problem_type in VALID_PROBLEM_TYPES else "general"
+                elif field == "CONTEXT":
+                    result["context"] = value or None
+                else:
+                    confidence = value.lower()
+                    if confidence in VALID_CONFIDENCE:
                         result["confidence"] = confidence
             
             return result
@@ -245,94 +647,93 @@ class VisionAnalyzer:
             
             
 
-    def annotate_image(self, image_path:str, prompt:str) -> Dict:        
-        try:
-            file_id = self.create_file_for_vision(image_path)
+    def annotate_image(self, image_path:str, prompt:str) -> Dict:
+        file_id = self.create_file_for_vision(image_path)
+        if not file_id:
+            return {
+                "success": False,
+                "error": "Failed to create file for vision",
+            }
+        return self._annotate_image_part({"type": "input_image", "file_id": file_id, "detail": "high"}, prompt)
+
+    async def aannotate_image(self, image_path:str, prompt:str) -> Dict:
+        """
+        Async version of annotate_image
+        """
+        async with self._limit():
+            file_id = await self.acreate_file_for_vision(image_path)
             if not file_id:
                 return {
                     "success": False,
                     "error": "Failed to create file for vision",
                 }
-            
-            #call gpt4.1 mini api
-            response = self.client.responses.create(
-                model=self.model_name,
-                input=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": prompt},
-                        {
-                            "type": "input_image",
-                            "file_id": file_id,
-                            "detail": "high",
-                        },
-                    ],
-                }],
-                text={"verbosity": "medium"}
-            )
-            raw = response.output_text
+
             try:
-                data= json.loads(raw)
+                response = await self.async_client.responses.create(
+                    **self._vision_request(prompt, {"type": "input_image", "file_id": file_id, "detail": "high"}, text_format=ANNOTATION_TEXT_FORMAT, mode="annotate")
+                )
             except Exception as e:
-                return {"success": False, "error": "invalid JSON response", "raw": raw}
-            
-            #basic validation/clamping for different shapes
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "model": self.model_name,
+                }
 
-            def clamp01(v: float) -> float:
-                try:
-                    return max(0.0, min(1.0, float(v)))
-                except Exception:
-                    return 0.0
-            
+        return self._annotation_result(response.output_text)
+
+    def annotate_image_from_bytes(self, image_b64:str, prompt:str, mime_type:str = "image/png") -> Dict:
+        """
+        Same as annotate_image, but takes an already base64 encoded image
+        """
+        return self._annotate_image_part(self._inline_image_part(image_b64, mime_type, detail="high"), prompt)
+
+    def _annotate_image_part(self, image_part:Dict, prompt:str) -> Dict:
+        try:
+            #call gpt4.1 mini api
+            response = self.client.responses.create(**self._vision_request(prompt, image_part, ANNOTATION_TEXT_FORMAT, mode="annotate"))
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "model": self.model_name,
+            }
+        return self._annotation_result(response.output_text)
+
+    def _annotation_result(self, raw:str) -> Dict:
+        try:
+            data = orjson.loads(raw)
+        except Exception as e:
+            #only reachable on a refusal or a response cut off by the token limit
+            return {"success": False, "error": "invalid JSON response", "raw": raw}
+        if not isinstance(data, dict):
+            return {"success": False, "error": "annotation response is not a JSON object", "raw": raw}
+
+        try:
+            #basic validation/clamping, driven by the per shape specs in _SHAPES
             annotations = []
 
-            for ann in data.get("annotations", []):
-                if ann.get("type") != "highlight":
-                    continue
-                
-                tl = ann.get("topLeft", {}) or {}
-                w = ann.get("width", 0.0)
-                h = ann.get("height", 0.0)
-                if w is None or h is None:
+            for ann in data.get("annotations") or []:
+                spec = _SHAPES.get(ann.get("type")) if isinstance(ann, dict) else None
+                if spec is None:
                     continue
 
-                try:
-                    w = float(w)
-                    h = float(h)
-                except ValueError:
-                    continue
+                annotation = _validate_annotation(ann, spec)
+                if annotation is not None:
+                    annotations.append(annotation)
 
-                if w <= 0 or w>1 or h<=0 or h>1:
-                    continue
-                
-                annotations.append({
-                    "type": "highlight",
-                    "top_left": {
-                        "x": clamp01(tl.get("x", 0.0)),
-                        "y": clamp01(tl.get("y", 0.0)),
-                    },
-                    "width": w,
-                    "height": h,
-                    "colorHex": ann.get("colorHex", "#FFFF00"),
-                    "opacity": max(0.0, min(1.0, float(ann.get("opacity", 0.25)))),
-                })
-            
 
-            metadata = data.get("metadata", {})
-            if not metadata.get("annotations", []):
-                metadata = {
-                    "problem_type":None,
-                    "context":None,
-                    "confidence":None,
-                }
+            #callers merge this over their own detection, so leave out anything the model didn't send
+            metadata = data.get("metadata")
+            if not isinstance(metadata, dict):
+                metadata = {}
 
-                return {
-                    "success": True,
-                    "annotations": annotations,
-                    "metadata": metadata,
-                    "raw": raw,
-                    "model": self.model_name,
-                }
+            return {
+                "success": True,
+                "annotations": annotations,
+                "metadata": metadata,
+                "raw": raw,
+                "model": self.model_name,
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -341,15 +742,6 @@ class VisionAnalyzer:
                 "model": self.model_name,
             }
 
-                
-                    
-
 
-    
-
-                
-
-
-
-        
-        
\ No newline at end of file
+# Singleton instance
+vision_analyzer = VisionAnalyzer()
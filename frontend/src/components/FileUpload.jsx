@@ -14,7 +14,16 @@ const FileUpload = ({ onUploadSuccess }) => {
     setStatus('Uploading...');
 
     try {
-      const result = await chatAPI.uploadFile(file);
+      const upload = await chatAPI.uploadFile(file);
+      if (upload.status === 'error') {
+        throw new Error(upload.error);
+      }
+
+      setStatus(`Processing ${file.name}...`);
+      const result = await chatAPI.waitForUpload(upload.job_id);
+      if (result.status === 'error') {
+        throw new Error(result.error);
+      }
       setStatus(`✅ ${file.name} uploaded successfully!`);
       onUploadSuccess && onUploadSuccess(result);
     } catch (error) {
@@ -86,6 +86,22 @@ export const chatAPI = {
     
     return response.data;
   },
+
+  // /upload returns a job id right away, processing finishes in the background
+  getUploadStatus: async (jobId) => {
+    const response = await axios.get(`${API_BASE}/upload/status/${jobId}`);
+    return response.data;
+  },
+
+  waitForUpload: async (jobId, intervalMs = 1000) => {
+    for (;;) {
+      const job = await chatAPI.getUploadStatus(jobId);
+      if (job.status === 'success' || job.status === 'error') {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
   
   getDocuments: async () => {
     const response = await axios.get(`${API_BASE}/documents`);